@@ -1,129 +1,2919 @@
 # Flask API for Vietnamese Legal QA
 # Integrates with any Gradio API via environment variables
 
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Response, request, jsonify, render_template, send_from_directory
 from flask_cors import CORS
+import click
 import os
 import logging
 import time
-from typing import Optional, Dict, Any
-from gradio_client import Client
+from typing import Optional, Dict, Any, Callable, List, Union
+from gradio_client import Client, __version__ as gradio_client_version
+from gradio_client.client import Job
+from gradio_client.utils import TooManyRequestsError
 from dotenv import load_dotenv
 import threading
+import queue
+import uuid
+import random
+import json
+import hashlib
+import socket
+import sqlite3
+import urllib.parse
+import httpx
+from collections import OrderedDict, deque
+import concurrent.futures
+from contextlib import contextmanager
 from functools import wraps
 from datetime import datetime
 import traceback
+import zlib
+import re
+import unicodedata
+
+try:
+    import numpy as np
+except ImportError:  # Only needed for the semantic cache
+    np = None
+
+try:
+    import zstandard
+except ImportError:  # zlib is used unless CACHE_COMPRESSION=zstd
+    zstandard = None
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging with UTF-8 encoding to handle unicode characters
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('api.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
+# Configure logging with UTF-8 encoding to handle unicode characters
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('api.log', encoding='utf-8'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+app = Flask(__name__, template_folder='templates', static_folder='static')
+
+# Enhanced CORS configuration
+CORS(app, 
+     origins=['*'],  # Allow all origins, configure specifically for production
+     methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
+     allow_headers=['Content-Type', 'Authorization', 'X-API-Key', 'X-Request-Timeout'],
+     supports_credentials=True
+)
+
+class CircuitOpenError(ConnectionError):
+    """Raised when a circuit breaker is rejecting upstream calls"""
+    
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open circuit breaker for upstream calls.
+    
+    After `failure_threshold` consecutive failures the circuit opens and
+    calls fail fast with CircuitOpenError. Once `recovery_timeout` seconds
+    have passed a single probe call is let through (half-open); its outcome
+    closes the circuit again or re-opens it.
+    """
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._times_opened = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+    
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+    
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+    
+    def _retry_after(self) -> float:
+        return max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+    
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go upstream now"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                logger.info(f"Circuit '{self.name}' half-open, sending probe request")
+                return
+            self._rejected += 1
+            raise CircuitOpenError(f"Circuit '{self.name}' is open; upstream calls are suspended",
+                                   retry_after=self._retry_after())
+    
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit '{self.name}' closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+    
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or (state == self.CLOSED and self._failures >= self.failure_threshold):
+                logger.warning(f"Circuit '{self.name}' opened after {self._failures} failure(s)")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._times_opened += 1
+            self._probe_in_flight = False
+    
+    def release(self):
+        """Give back a half-open probe slot without recording an outcome"""
+        with self._lock:
+            self._probe_in_flight = False
+    
+    def record(self, error: Optional[BaseException]):
+        """
+        Record the outcome of a call. Caller errors say nothing about the
+        upstream, so they only give back a half-open probe slot
+        """
+        if error is None:
+            self.record_success()
+        elif isinstance(error, (ValueError, TypeError)):
+            self.release()
+        else:
+            self.record_failure()
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state()
+            return {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'times_opened': self._times_opened,
+                'rejected_calls': self._rejected,
+                'retry_after': round(self._retry_after(), 2) if state == self.OPEN else 0.0
+            }
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a request's deadline passes before the upstream answers"""
+
+class Deadline:
+    """
+    A point in time by which a request must be answered. Deadline(None)
+    never expires, so callers can always pass one along.
+    """
+    
+    def __init__(self, timeout: Optional[float]):
+        self.timeout = timeout
+        self.expires_at = None if timeout is None else time.monotonic() + timeout
+    
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None for no deadline"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+    
+    def cap(self, timeout: Optional[float]) -> Optional[float]:
+        """The smaller of `timeout` and the time left"""
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        return remaining if timeout is None else min(timeout, remaining)
+    
+    @property
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+    
+    def check(self):
+        if self.expired:
+            raise DeadlineExceededError(f"Request deadline of {self.timeout:.1f}s exceeded")
+
+class InvalidEndpointError(ValueError):
+    """Raised when a caller asks for an endpoint the upstream does not expose"""
+
+class UpstreamOverloadedError(ConnectionError):
+    """Raised when every upstream queue is too long to answer before the deadline"""
+    
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class RetryBudget:
+    """
+    Token bucket that caps retries at a fraction of overall traffic.
+    
+    Every first attempt deposits `ratio` tokens and every retry withdraws
+    one, with a small per-second floor so low-traffic periods can still
+    retry. This keeps retries from multiplying load on a failing upstream.
+    """
+    
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 1.0, max_tokens: float = 100.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._tokens = min(max_tokens, max(1.0, min_per_second))
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.max_tokens, self._tokens + (now - self._last_refill) * self.min_per_second)
+        self._last_refill = now
+    
+    def deposit(self):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+    
+    def withdraw(self) -> bool:
+        with self._lock:
+            self._refill()
+            # Small tolerance so ten deposits of 0.1 add up to a whole retry
+            if self._tokens >= 1.0 - 1e-9:
+                self._tokens = max(0.0, self._tokens - 1.0)
+                return True
+            return False
+    
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+def classify_upstream_error(error: BaseException) -> str:
+    """
+    Classify an upstream error for retrying: 'fatal' errors are raised
+    immediately, 'throttled' ones retry with a longer backoff and anything
+    else is a transient 'retry'
+    """
+    if isinstance(error, (CircuitOpenError, UpstreamOverloadedError, DeadlineExceededError, ValueError, TypeError)):
+        return 'fatal'
+    if isinstance(error, TooManyRequestsError):
+        return 'throttled'
+    if isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 429:
+        return 'throttled'
+    return 'retry'
+
+class RetryPolicy:
+    """
+    Retries a call with exponential backoff and full jitter, subject to
+    an error classifier and an optional shared RetryBudget
+    """
+    
+    THROTTLED_MULTIPLIER = 4.0
+    
+    def __init__(self, max_attempts: int = 2, base_delay: float = 0.2, max_delay: float = 5.0,
+                 budget: Optional[RetryBudget] = None,
+                 classifier: Callable[[BaseException], str] = classify_upstream_error):
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.classifier = classifier
+        self.retries = 0
+        self.budget_exhausted = 0
+    
+    def backoff(self, attempt: int, kind: str = 'retry') -> float:
+        """Full-jitter delay before retry number `attempt` (1-based)"""
+        ceiling = self.base_delay * (2 ** (attempt - 1))
+        if kind == 'throttled':
+            ceiling *= self.THROTTLED_MULTIPLIER
+        return random.uniform(0, min(self.max_delay, ceiling))
+    
+    def call(self, fn: Callable[[], Any], deadline: Optional['Deadline'] = None) -> Any:
+        if self.budget:
+            self.budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                return fn()
+            except Exception as e:
+                attempt += 1
+                kind = self.classifier(e)
+                if kind == 'fatal' or attempt >= self.max_attempts:
+                    raise
+                delay = self.backoff(attempt, kind)
+                remaining = deadline.remaining() if deadline else None
+                if remaining is not None and delay >= remaining:
+                    logger.warning(f"Not retrying, the request deadline would pass during backoff: {e}")
+                    raise
+                if self.budget and not self.budget.withdraw():
+                    self.budget_exhausted += 1
+                    logger.warning(f"Retry budget exhausted, not retrying: {e}")
+                    raise
+                self.retries += 1
+                logger.warning(f"Attempt {attempt} failed ({e}); retrying in {delay:.2f}s")
+                time.sleep(delay)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'max_attempts': self.max_attempts,
+            'retries': self.retries,
+            'budget_exhausted': self.budget_exhausted,
+            'budget_tokens': round(self.budget.tokens, 2) if self.budget else None
+        }
+
+class SchemaCache:
+    """
+    On-disk cache of Gradio app config and API info, keyed by URL.
+    
+    Entries carry a hash of the config they were built from; whenever a
+    fresh config is seen (e.g. by probe()) the hash is compared and a
+    mismatching entry is dropped, so a redeployed upstream is picked up.
+    """
+    
+    def __init__(self, directory: str, ttl: float = 86400.0):
+        self.directory = directory
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+    
+    @staticmethod
+    def config_hash(config: Dict[str, Any]) -> str:
+        return hashlib.sha256(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
+    
+    def _path(self, url: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+    
+    def load(self, url: str) -> Optional[Dict[str, Any]]:
+        """Return a valid cached entry for url, or None"""
+        path = self._path(url)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable schema cache entry {path}: {e}")
+            self.invalidate(url)
+            return None
+        
+        if (entry.get('url') != url
+                or entry.get('client_version') != gradio_client_version
+                or time.time() - entry.get('saved_at', 0) > self.ttl
+                or entry.get('config_hash') != self.config_hash(entry.get('config', {}))):
+            self.invalidate(url)
+            return None
+        return entry
+    
+    def save(self, url: str, config: Dict[str, Any], api_info: Dict[str, Any]):
+        entry = {
+            'url': url,
+            'client_version': gradio_client_version,
+            'config_hash': self.config_hash(config),
+            'saved_at': time.time(),
+            'config': config,
+            'api_info': api_info
+        }
+        path = self._path(url)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with self._lock:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(entry, f)
+                os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write schema cache for {url}: {e}")
+    
+    def invalidate(self, url: str):
+        try:
+            os.remove(self._path(url))
+            logger.info(f"Invalidated schema cache for {url}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not invalidate schema cache for {url}: {e}")
+    
+    def validate(self, url: str, config: Dict[str, Any]) -> bool:
+        """Compare a freshly fetched config with the cached one; drop the entry on mismatch"""
+        entry = self.load(url)
+        if entry is None:
+            return False
+        if entry['config_hash'] != self.config_hash(config):
+            logger.info(f"Upstream config changed for {url}")
+            self.invalidate(url)
+            return False
+        return True
+
+class CachedSchemaClient(Client):
+    """
+    gradio Client that takes its config and API info from a SchemaCache
+    instead of downloading them on every construction
+    """
+    
+    def __init__(self, src: str, schema_cache: Optional[SchemaCache] = None, **kwargs):
+        self._schema_cache = schema_cache
+        self._cached_schema = schema_cache.load(src) if schema_cache else None
+        super().__init__(src, **kwargs)
+        if schema_cache and self._cached_schema is None:
+            schema_cache.save(src, self.config, self._info)
+    
+    def _get_config(self) -> dict:
+        if self._cached_schema is not None:
+            return self._cached_schema['config']
+        return super()._get_config()
+    
+    def _get_api_info(self):
+        if self._cached_schema is not None:
+            return self._cached_schema['api_info']
+        return super()._get_api_info()
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution: the
+    first caller runs the function and everyone else waits for, and
+    reuses, its result (or exception).
+    
+    With detached=True the function runs on its own thread and every
+    caller, the first included, only waits for it until its own deadline,
+    so one impatient caller cannot cut the shared call short for the rest.
+    """
+    
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+    
+    def __init__(self, detached: bool = False):
+        self.detached = detached
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+    
+    def _run(self, key, call: '_Call', fn: Callable[[], Any]):
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+    
+    def do(self, key, fn: Callable[[], Any], deadline: Optional[Deadline] = None) -> tuple:
+        """Run fn once per in-flight key; returns (result, shared). Waiters give up at their deadline"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+        
+        if leader and not self.detached:
+            self._run(key, call, fn)
+        elif leader:
+            threading.Thread(target=self._run, args=(key, call, fn), name='single-flight', daemon=True).start()
+        if not call.done.wait(deadline.remaining() if deadline else None):
+            raise DeadlineExceededError(f"Deadline of {deadline.timeout}s exceeded waiting for a shared call")
+        if call.error is not None:
+            raise call.error
+        return call.result, not leader
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'executions': self.executions, 'coalesced': self.coalesced, 'in_flight': len(self._calls)}
+
+class _PoolSlot:
+    """A pooled gradio Client together with its health state"""
+    
+    def __init__(self, index: int):
+        self.index = index
+        self.client = None
+        self.generation = 0
+        self.healthy = False
+        self.failures = 0
+        self.last_connected = None
+        self.last_error = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'index': self.index,
+            'connected': self.client is not None,
+            'generation': self.generation,
+            'healthy': self.healthy,
+            'failures': self.failures,
+            'last_connected': self.last_connected.isoformat() if self.last_connected else None,
+            'last_error': self.last_error
+        }
+
+class ClientPool:
+    """
+    A bounded pool of gradio Client instances with checkout/checkin.
+    
+    Slots are connected lazily on checkout. A slot that fails `max_failures`
+    times in a row is marked broken and its client is replaced on the next
+    checkout, so one dead session never poisons the whole pool.
+    
+    Reconnects are single-flight: every client carries the pool generation
+    it was built in, and when several slots of the same generation break
+    at once only one of them probes the upstream by building a client.
+    The others wait for that attempt and, once the upstream is known to be
+    reachable, build their own client, so a dead upstream is hit once and
+    every slot still ends up with a separate session. A late failure from
+    an older generation cannot tear down a newer client.
+    """
+    
+    def __init__(self, api_url: str, size: int = 4, checkout_timeout: float = 30.0,
+                 max_failures: int = 1, schema_cache: Optional[SchemaCache] = None):
+        self.api_url = api_url
+        self.schema_cache = schema_cache
+        self.size = max(1, int(size))
+        self.checkout_timeout = checkout_timeout
+        self.max_failures = max(1, int(max_failures))
+        self.slots = [_PoolSlot(i) for i in range(self.size)]
+        self.generation = 0
+        self.reconnects = 0
+        self.stale_failures = 0
+        self._reconnect_flight = SingleFlight()
+        self.on_reconnect = None  # called with the new generation after a reconnect
+        self.on_connect = None  # called after a slot connects for the first time
+        self._lock = threading.Lock()
+        # LIFO so the most recently used (warm) sessions are reused first
+        self._idle = queue.LifoQueue()
+        for slot in reversed(self.slots):
+            self._idle.put(slot)
+    
+    def _build_client(self):
+        if self.schema_cache:
+            return CachedSchemaClient(self.api_url, schema_cache=self.schema_cache)
+        return Client(self.api_url)
+    
+    def _unused_clients(self, clients: list) -> list:
+        """Clients no slot refers to any more (call with the lock held)"""
+        in_use = {id(slot.client) for slot in self.slots}
+        return [client for client in clients if client is not None and id(client) not in in_use]
+    
+    @staticmethod
+    def _close(clients: list):
+        """Stop the heartbeat threads of clients that will not be used again"""
+        for client in clients:
+            try:
+                client.close()
+            except Exception:
+                pass
+    
+    def _reconnect(self, broken_generation: int) -> tuple:
+        """
+        Build a replacement for a client of `broken_generation`. Only one
+        caller per generation reconnects first; the rest build their own
+        client after it succeeded. Returns (generation, client).
+        """
+        def build():
+            with self._lock:
+                if self.generation > broken_generation:
+                    return self.generation, None  # Someone already reconnected after this failure
+            client = self._build_client()
+            with self._lock:
+                self.generation += 1
+                self.reconnects += 1
+                generation = self.generation
+            logger.info(f"Reconnected to API {self.api_url} (generation {generation})")
+            if self.on_reconnect:
+                self.on_reconnect(generation)
+            return generation, client
+        
+        (generation, client), shared = self._reconnect_flight.do(broken_generation, build)
+        if shared or client is None:
+            client = self._build_client()
+        return generation, client
+    
+    def connect_slot(self, slot: _PoolSlot) -> bool:
+        """
+        (Re)build the client held by a slot. A slot that has never been
+        connected builds its client directly; a broken one goes through the
+        single-flight reconnect for its generation. The client is swapped
+        in atomically.
+        """
+        first = slot.last_connected is None
+        try:
+            if first:
+                client = self._build_client()
+                with self._lock:
+                    generation = self.generation
+            else:
+                generation, client = self._reconnect(slot.generation)
+        except Exception as e:
+            logger.error(f"Pool slot {slot.index} failed to connect to API: {e}")
+            unused = []
+            with self._lock:
+                if not slot.healthy:
+                    previous, slot.client = slot.client, None
+                    slot.last_error = str(e)
+                    unused = self._unused_clients([previous])
+            self._close(unused)
+            return False
+        
+        with self._lock:
+            if slot.healthy and slot.client is not None and slot.generation >= generation:
+                unused = self._unused_clients([client])
+            else:
+                previous = slot.client
+                slot.client = client
+                slot.generation = generation
+                slot.healthy = True
+                slot.failures = 0
+                slot.last_error = None
+                slot.last_connected = datetime.now()
+                unused = self._unused_clients([previous])
+        self._close(unused)
+        logger.info(f"Pool slot {slot.index} connected to API: {self.api_url}")
+        if first and self.on_connect:
+            self.on_connect()
+        return True
+    
+    def refresh(self) -> int:
+        """
+        Proactively reconnect broken slots so request threads never pay for
+        it. Slots that were never used stay lazy, except that one slot is
+        kept connected so the pool is warm. Returns the number reconnected.
+        """
+        stale = [slot for slot in self.slots if not slot.healthy and slot.last_connected is not None]
+        if not any(slot.healthy for slot in self.slots) and not stale:
+            stale = [self.slots[0]]
+        return sum(1 for slot in stale if self.connect_slot(slot))
+    
+    def invalidate_all(self):
+        """Mark every slot for reconnection, e.g. after the upstream schema changed"""
+        with self._lock:
+            for slot in self.slots:
+                slot.healthy = False
+    
+    def checkout(self, timeout: Optional[float] = None) -> _PoolSlot:
+        """Take an idle slot out of the pool, connecting it if needed"""
+        if timeout is None or timeout > self.checkout_timeout:
+            timeout = self.checkout_timeout
+        try:
+            slot = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise ConnectionError("Timed out waiting for a free Gradio client")
+        
+        if slot.client is None or not slot.healthy:
+            if not self.connect_slot(slot):
+                self._idle.put(slot)
+                raise ConnectionError("Unable to connect to Gradio API")
+        return slot
+    
+    def mark_failed(self, slot: _PoolSlot, error: Optional[Exception] = None,
+                    generation: Optional[int] = None):
+        """
+        Record a failure on a slot, marking it broken after repeated
+        failures. `generation` is the slot generation the failed call ran
+        on; failures from an older client are ignored.
+        """
+        with self._lock:
+            if generation is not None and generation != slot.generation:
+                self.stale_failures += 1
+                return
+            slot.failures += 1
+            slot.last_error = str(error) if error else slot.last_error
+            if slot.failures >= self.max_failures and slot.healthy:
+                logger.warning(f"Pool slot {slot.index} marked broken after {slot.failures} failure(s)")
+                slot.healthy = False
+    
+    def checkin(self, slot: _PoolSlot, failed: bool = False, error: Optional[Exception] = None):
+        """Return a slot to the pool"""
+        if failed:
+            self.mark_failed(slot, error)
+        else:
+            slot.failures = 0
+        self._idle.put(slot)
+    
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """
+        Context manager yielding a checked-out slot. ValueError and
+        TypeError are caller errors (bad endpoint or arguments) and do not
+        count against the slot
+        """
+        slot = self.checkout(timeout)
+        try:
+            yield slot
+        except (ValueError, TypeError):
+            self.checkin(slot)
+            raise
+        except Exception as e:
+            self.checkin(slot, failed=True, error=e)
+            raise
+        else:
+            self.checkin(slot)
+    
+    @property
+    def last_connected(self) -> Optional[datetime]:
+        times = [slot.last_connected for slot in self.slots if slot.last_connected]
+        return max(times) if times else None
+    
+    def any_client(self):
+        """Return any connected client, or None"""
+        for slot in self.slots:
+            if slot.client is not None and slot.healthy:
+                return slot.client
+        return None
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'size': self.size,
+            'idle': self._idle.qsize(),
+            'connected': sum(1 for slot in self.slots if slot.client is not None),
+            'healthy': sum(1 for slot in self.slots if slot.healthy),
+            'generation': self.generation,
+            'reconnects': self.reconnects,
+            'stale_failures': self.stale_failures,
+            'reconnect_flights': self._reconnect_flight.stats(),
+            'slots': [slot.to_dict() for slot in self.slots]
+        }
+
+class LatencyTracker:
+    """Rolling window of successful call latencies, per endpoint"""
+    
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+    
+    def record(self, key: str, latency: float):
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(latency)
+    
+    def percentile(self, key: str, p: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < max(1, min_samples):
+            return None
+        index = min(len(samples) - 1, int(round(p / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+class HedgingPolicy:
+    """
+    Settings and counters for hedged requests: once a call has been running
+    longer than the learned `percentile` latency of its endpoint, a backup
+    call to the same endpoint is sent to another upstream (or another
+    session of the only one) and the first answer wins. Backups never go
+    to a different endpoint, since each endpoint serves its own model.
+    """
+    
+    ENDPOINTS = ('/generate_response', '/generate_response_1')
+    
+    def __init__(self, enabled: bool = False, percentile: float = 95.0, min_delay: float = 0.5,
+                 min_samples: int = 20, window: int = 200):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.latencies = LatencyTracker(window=window)
+        self.hedges_sent = 0
+        self.hedges_won = 0
+    
+    def delay(self, endpoint: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None until enough latencies are known"""
+        learned = self.latencies.percentile(endpoint, self.percentile, self.min_samples)
+        if learned is None:
+            return None
+        return max(self.min_delay, learned)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'percentile': self.percentile,
+            'hedges_sent': self.hedges_sent,
+            'hedges_won': self.hedges_won,
+            'delay': {endpoint: self.delay(endpoint) for endpoint in self.ENDPOINTS}
+        }
+
+class Upstream:
+    """
+    One Gradio replica: its client pool, circuit breaker and load statistics
+    """
+    
+    EWMA_ALPHA = 0.3
+    
+    def __init__(self, url: str, pool: ClientPool, breaker: CircuitBreaker,
+                 schema_cache: Optional[SchemaCache] = None):
+        self.url = url
+        self.pool = pool
+        self.breaker = breaker
+        self.schema_cache = schema_cache
+        self.outstanding = 0
+        self.ewma_latency = None
+        self.requests = 0
+        self.failures = 0
+        self.last_probe_ok = None
+        self.last_probe_error = None
+        self.config_hash = None
+        self.invalidated_schema = None  # config hash of the last schema dropped over an unknown endpoint
+        self.endpoint_latency = {}
+        self.queue_size = None
+        self.queue_eta = None
+        self.queue_updated = None
+        self.queue_max_age = 30.0
+        self._lock = threading.Lock()
+    
+    @property
+    def ejected(self) -> bool:
+        """An upstream is ejected from balancing while its circuit is open"""
+        return self.breaker.state == CircuitBreaker.OPEN
+    
+    def begin(self):
+        with self._lock:
+            self.outstanding += 1
+            self.requests += 1
+    
+    def _ewma(self, previous: Optional[float], sample: float) -> float:
+        if previous is None:
+            return sample
+        return self.EWMA_ALPHA * sample + (1 - self.EWMA_ALPHA) * previous
+    
+    def end(self, latency: Optional[float], error: Optional[BaseException] = None,
+            endpoint: Optional[str] = None):
+        with self._lock:
+            self.outstanding = max(0, self.outstanding - 1)
+            if error is not None:
+                self.failures += 1
+            elif latency is not None:
+                self.ewma_latency = self._ewma(self.ewma_latency, latency)
+                if endpoint:
+                    self.endpoint_latency[endpoint] = self._ewma(self.endpoint_latency.get(endpoint), latency)
+    
+    def _queue_status_url(self) -> str:
+        client = self.pool.any_client()
+        base = getattr(client, 'src_prefixed', None) or self.url.rstrip('/') + '/'
+        return urllib.parse.urljoin(base, 'queue/status')
+    
+    def poll_queue(self, timeout: float = 5.0):
+        """Refresh queue size and ETA from the upstream's /queue/status"""
+        try:
+            r = httpx.get(self._queue_status_url(), timeout=timeout)
+            r.raise_for_status()
+            status = r.json()
+        except Exception:
+            with self._lock:
+                self.queue_size = None
+                self.queue_eta = None
+                self.queue_updated = None
+            raise
+        queue_size = status.get('queue_size') or 0
+        eta = status.get('queue_eta')
+        if eta is None:
+            eta = status.get('rank_eta')
+        if eta is None:
+            eta = queue_size * (status.get('avg_event_concurrent_process_time') or 0.0)
+        with self._lock:
+            self.queue_size = queue_size
+            self.queue_eta = float(eta)
+            self.queue_updated = time.monotonic()
+    
+    def check_endpoint(self, client, api_name: Optional[str]):
+        """
+        Raise InvalidEndpointError if the client's API info has no such
+        endpoint. The cached schema may predate a redeploy that added it,
+        so it is dropped, but only once per schema version
+        """
+        info = getattr(client, '_info', None)
+        named = info.get('named_endpoints') if isinstance(info, dict) else None
+        if not api_name or not isinstance(named, dict) or api_name in named:
+            return
+        cached = getattr(client, '_cached_schema', None)
+        if self.schema_cache and cached is not None:
+            with self._lock:
+                stale = self.invalidated_schema != cached['config_hash']
+                self.invalidated_schema = cached['config_hash']
+            if stale:
+                self.schema_cache.invalidate(self.url)
+        raise InvalidEndpointError(f"Unknown endpoint {api_name} on {self.url}")
+    
+    def queue_wait(self) -> Optional[float]:
+        """
+        Seconds a new call would wait in the upstream queue, as last
+        reported by it. None when no recent queue status is known.
+        """
+        with self._lock:
+            if self.queue_updated is None or time.monotonic() - self.queue_updated > self.queue_max_age:
+                return None
+            return self.queue_eta
+    
+    def expected_wait(self, endpoint: Optional[str] = None) -> Optional[float]:
+        """
+        Estimated seconds until a new call to `endpoint` finishes: the
+        upstream queue ETA plus the endpoint's typical latency. None when
+        no recent queue status is known. Only used for ranking; shedding
+        relies on queue_wait alone, since a latency learned from one slow
+        call would otherwise shed short-deadline calls that could succeed
+        """
+        wait = self.queue_wait()
+        if wait is None:
+            return None
+        with self._lock:
+            latency = self.endpoint_latency.get(endpoint) or self.ewma_latency or 0.0
+        return wait + latency
+    
+    def load_key(self, strategy: str, endpoint: Optional[str] = None) -> tuple:
+        """Sort key used by the balancer; lower is better"""
+        ewma = self.ewma_latency or 0.0
+        if strategy == 'ewma':
+            # Peak-EWMA style cost: expected latency scaled by queue depth
+            return (ewma * (self.outstanding + 1), self.outstanding)
+        if strategy == 'shortest_queue':
+            wait = self.expected_wait(endpoint)
+            return (wait if wait is not None else 0.0, self.outstanding, ewma)
+        return (self.outstanding, ewma)
+    
+    def probe(self, timeout: float = 10.0) -> Dict[str, Any]:
+        """
+        Fetch the upstream config with a single request, revalidating the
+        schema cache against it
+        """
+        try:
+            r = httpx.get(urllib.parse.urljoin(self.url, 'config'), timeout=timeout)
+            r.raise_for_status()
+            config = r.json()
+        except Exception as e:
+            self.last_probe_ok = False
+            self.last_probe_error = str(e)
+            raise
+        self.last_probe_ok = True
+        self.last_probe_error = None
+        if self.schema_cache:
+            self.schema_cache.validate(self.url, config)
+        config_hash = SchemaCache.config_hash(config)
+        if self.config_hash is not None and config_hash != self.config_hash:
+            logger.info(f"Upstream {self.url} was redeployed; reconnecting its pool")
+            self.pool.invalidate_all()
+        self.config_hash = config_hash
+        return config
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                'url': self.url,
+                'outstanding': self.outstanding,
+                'requests': self.requests,
+                'failures': self.failures,
+                'ewma_latency_ms': round(self.ewma_latency * 1000, 1) if self.ewma_latency is not None else None,
+                'reachable': self.last_probe_ok,
+                'probe_error': self.last_probe_error,
+                'queue_size': self.queue_size,
+                'queue_eta': self.queue_eta,
+                'endpoint_latency_ms': {endpoint: round(latency * 1000, 1)
+                                        for endpoint, latency in self.endpoint_latency.items()}
+            }
+        stats['ejected'] = self.ejected
+        stats['circuit'] = self.breaker.stats()
+        stats['pool'] = self.pool.stats()
+        return stats
+
+class GradioAPIClient:
+    """
+    A client class for interacting with any Gradio API.
+    
+    Several upstream URLs may be given; calls are balanced across them by
+    least outstanding requests or EWMA latency, and replicas whose circuit
+    is open are skipped until they recover.
+    """
+    
+    STRATEGIES = ('least_outstanding', 'ewma', 'shortest_queue')
+    
+    def __init__(self, api_url: Union[str, List[str]], pool_size: int = 4, pool_timeout: float = 30.0,
+                 pool_max_failures: int = 1, lazy: bool = True,
+                 schema_cache: Optional[SchemaCache] = None,
+                 breaker_factory: Optional[Callable[[str], CircuitBreaker]] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 strategy: str = 'least_outstanding',
+                 hedging: Optional[HedgingPolicy] = None,
+                 queue_shedding: bool = True,
+                 warmer: Optional['ModelWarmer'] = None):
+        if isinstance(api_url, str):
+            api_url = [url.strip() for url in api_url.split(',') if url.strip()]
+        if not api_url:
+            raise ValueError("At least one Gradio API URL is required")
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown load balancing strategy: {strategy}")
+        
+        self.api_urls = list(api_url)
+        self.api_url = self.api_urls[0]
+        self.schema_cache = schema_cache
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.hedging = hedging or HedgingPolicy()
+        self.strategy = strategy
+        self.queue_shedding = queue_shedding
+        self.shed_calls = 0
+        self.warmer = warmer
+        breaker_factory = breaker_factory or CircuitBreaker
+        self.upstreams = [
+            Upstream(url,
+                     ClientPool(url, size=pool_size, checkout_timeout=pool_timeout,
+                                max_failures=pool_max_failures, schema_cache=schema_cache),
+                     breaker_factory(url),
+                     schema_cache=schema_cache)
+            for url in self.api_urls
+        ]
+        if warmer:
+            for upstream in self.upstreams:
+                upstream.pool.on_reconnect = lambda generation, upstream=upstream: warmer.warm_async(self, upstream)
+                upstream.pool.on_connect = lambda upstream=upstream: warmer.warm_async(self, upstream, if_cold=True)
+        self._warmup_thread = None
+        # With lazy=True no network call happens here; the first request
+        # (or start_warmup) opens the upstream connection instead
+        if not lazy:
+            self._connect()
+    
+    @property
+    def client(self):
+        """A connected gradio Client from any upstream (None if nothing is connected)"""
+        for upstream in self.upstreams:
+            client = upstream.pool.any_client()
+            if client is not None:
+                return client
+        return None
+    
+    @property
+    def last_connected(self) -> Optional[datetime]:
+        times = [u.pool.last_connected for u in self.upstreams if u.pool.last_connected]
+        return max(times) if times else None
+    
+    def _connect(self):
+        """Establish a connection on one pool slot of every upstream"""
+        connected = False
+        for upstream in self.upstreams:
+            try:
+                slot = upstream.pool.checkout()
+            except ConnectionError:
+                continue
+            upstream.pool.checkin(slot)
+            connected = True
+        return connected
+    
+    def probe(self, timeout: float = 10.0) -> Dict[str, bool]:
+        """
+        Probe every upstream's config; raises ConnectionError if none is reachable
+        """
+        results = {}
+        for upstream in self.upstreams:
+            try:
+                upstream.probe(timeout=timeout)
+                results[upstream.url] = True
+            except Exception as e:
+                logger.warning(f"Probe failed for {upstream.url}: {e}")
+                results[upstream.url] = False
+        if not any(results.values()):
+            raise ConnectionError("No upstream Gradio API is reachable")
+        return results
+    
+    @property
+    def ready(self) -> bool:
+        """
+        Whether at least one upstream connection is established and, with
+        model warm-up enabled, at least one upstream has been warmed
+        """
+        if self.client is None:
+            return False
+        return self.warmer is None or any(self.warmer.is_warm(u) for u in self.upstreams)
+    
+    @property
+    def warming_up(self) -> bool:
+        return self._warmup_thread is not None and self._warmup_thread.is_alive()
+    
+    def start_warmup(self):
+        """
+        Connect (and warm the model, if configured) in a background thread
+        so process startup is not blocked
+        """
+        if self.warming_up:
+            return
+        
+        def warmup():
+            if self._connect():
+                logger.info("Background warm-up connected to Gradio API")
+            else:
+                logger.warning("Background warm-up could not connect; will retry on first request")
+                return
+            if self.warmer:
+                for upstream in self.upstreams:
+                    if upstream.pool.any_client() is not None:
+                        self.warmer.warm(self, upstream, wait=True)
+        
+        self._warmup_thread = threading.Thread(target=warmup, name='gradio-warmup', daemon=True)
+        self._warmup_thread.start()
+    
+    def _ranked_upstreams(self, exclude: tuple = (), endpoint: Optional[str] = None) -> List[Upstream]:
+        """Upstreams in balancing order; ejected replicas go last"""
+        candidates = [u for u in self.upstreams if u not in exclude] or list(self.upstreams)
+        random.shuffle(candidates)  # random tie-break between equally loaded replicas
+        return sorted(candidates, key=lambda u: (u.ejected, u.load_key(self.strategy, endpoint)))
+    
+    def _acquire_upstream(self, exclude: tuple = (), endpoint: Optional[str] = None,
+                          deadline: Optional['Deadline'] = None) -> Upstream:
+        """
+        Pick the best upstream whose circuit admits a call. Upstreams whose
+        reported queue ETA already exceeds the deadline are skipped; if that
+        leaves none, the call is shed with UpstreamOverloadedError.
+        """
+        remaining = deadline.remaining() if deadline else None
+        last_error = None
+        shortest_wait = None
+        for upstream in self._ranked_upstreams(exclude, endpoint):
+            wait = upstream.queue_wait() if self.queue_shedding else None
+            if wait is not None and remaining is not None and wait > remaining:
+                shortest_wait = wait if shortest_wait is None else min(shortest_wait, wait)
+                continue
+            try:
+                upstream.breaker.before_call()
+                return upstream
+            except CircuitOpenError as e:
+                last_error = e
+        if last_error is None and shortest_wait is not None:
+            self.shed_calls += 1
+            raise UpstreamOverloadedError(
+                f"Upstream queue ETA of {shortest_wait:.1f}s exceeds the request deadline",
+                retry_after=shortest_wait)
+        raise last_error
+    
+    def _submit(self, exclude: tuple = (), deadline: Optional['Deadline'] = None,
+                target: Optional[Upstream] = None, record_latency: bool = True, **kwargs) -> Job:
+        """
+        Submit a call on a pooled client of the chosen upstream (or of
+        `target`) and return its Job. Calls made with record_latency=False
+        (warm-ups) count for the circuit breaker but not for the latency
+        estimates used by balancing and hedging.
+        
+        The client is only held while the job is handed to gradio_client's
+        executor, so a few pooled sessions can carry many in-flight calls.
+        """
+        deadline = deadline or Deadline(None)
+        deadline.check()
+        if target is not None:
+            target.breaker.before_call()
+            upstream = target
+        else:
+            upstream = self._acquire_upstream(exclude, kwargs.get('api_name'), deadline)
+        upstream.begin()
+        started = time.monotonic()
+        try:
+            with upstream.pool.connection(timeout=deadline.remaining()) as slot:
+                generation = slot.generation
+                upstream.check_endpoint(slot.client, kwargs.get('api_name'))
+                job = slot.client.submit(**kwargs)
+        except Exception as e:
+            upstream.breaker.record(e)
+            upstream.end(None, e)
+            deadline.check()
+            raise
+        
+        settle_lock = threading.Lock()
+        
+        def settle(future=None):
+            """Account for the job exactly once, when it finishes or is abandoned"""
+            with settle_lock:
+                if job.settled:
+                    return
+                job.settled = True
+            if future is None or future.cancelled():
+                # Abandoned or cancelled on purpose; says nothing about upstream health
+                upstream.breaker.release()
+                upstream.end(None)
+                return
+            error = future.exception()
+            latency = time.monotonic() - started if record_latency else None
+            upstream.breaker.record(error)
+            upstream.end(latency, error, kwargs.get('api_name'))
+            if error is not None:
+                upstream.pool.mark_failed(slot, error, generation)
+            elif latency is not None and kwargs.get('api_name'):
+                self.hedging.latencies.record(kwargs['api_name'], latency)
+        
+        job.upstream = upstream
+        job.settled = False
+        job.settle = settle
+        job.future.add_done_callback(settle)
+        return job
+    
+    @staticmethod
+    def _abandon(job: Job):
+        """Cancel a job whose result is no longer wanted"""
+        job.cancel()
+        job.settle()
+    
+    def _await(self, job: Job, deadline: 'Deadline') -> Any:
+        """Wait for a job until the deadline, cancelling it upstream if the deadline passes"""
+        try:
+            return job.result(timeout=deadline.remaining())
+        except concurrent.futures.TimeoutError:
+            if job.done():
+                raise
+            self._abandon(job)
+            raise DeadlineExceededError(f"No answer from {job.upstream.url} within the request deadline")
+    
+    def _hedged_predict(self, tried: List[Upstream], deadline: Optional['Deadline'] = None, **kwargs) -> Any:
+        """
+        Like _predict, but if the call outlives the learned latency
+        percentile a backup call is raced against it
+        """
+        deadline = deadline or Deadline(None)
+        primary = self._submit(exclude=tuple(tried), deadline=deadline, **kwargs)
+        tried.append(primary.upstream)
+        endpoint = kwargs.get('api_name')
+        delay = self.hedging.delay(endpoint)
+        if delay is None:
+            return self._await(primary, deadline)
+        
+        try:
+            return primary.result(timeout=deadline.cap(delay))
+        except concurrent.futures.TimeoutError:
+            if primary.done():
+                raise
+            if deadline.expired:
+                self._abandon(primary)
+                raise DeadlineExceededError(f"No answer from {primary.upstream.url} within the request deadline")
+        
+        try:
+            backup = self._submit(exclude=(primary.upstream,), deadline=deadline, **kwargs)
+        except Exception as e:
+            logger.warning(f"Could not send hedge request: {e}")
+            return self._await(primary, deadline)
+        self.hedging.hedges_sent += 1
+        logger.info(f"Hedging slow call to {primary.upstream.url} after {delay:.2f}s via {backup.upstream.url}")
+        
+        pending = {primary.future: primary, backup.future: backup}
+        error = None
+        while pending:
+            done, _ = concurrent.futures.wait(list(pending), timeout=deadline.remaining(),
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            if not done:
+                for job in pending.values():
+                    self._abandon(job)
+                raise DeadlineExceededError("No hedged answer within the request deadline")
+            for future in done:
+                job = pending.pop(future)
+                if future.cancelled() or future.exception() is not None:
+                    error = error or (future.exception() if not future.cancelled() else None)
+                    continue
+                for loser in pending.values():
+                    self._abandon(loser)
+                if job is backup:
+                    self.hedging.hedges_won += 1
+                return future.result()
+        raise error or ConnectionError("Hedged requests were cancelled")
+    
+    def stats(self) -> List[Dict[str, Any]]:
+        return [upstream.stats() for upstream in self.upstreams]
+    
+    def _predict(self, tried: Optional[List[Upstream]] = None, deadline: Optional['Deadline'] = None,
+                 **kwargs) -> Any:
+        """
+        Run a call on a pooled client and wait for its result. Upstreams
+        listed in `tried` are avoided and the one used is appended to it.
+        """
+        deadline = deadline or Deadline(None)
+        job = self._submit(exclude=tuple(tried or ()), deadline=deadline, **kwargs)
+        if tried is not None:
+            tried.append(job.upstream)
+        return self._await(job, deadline)
+    
+    def submit_response(self,
+                        user_input: str,
+                        max_length: float = 512,
+                        temperature: float = 0.7,
+                        top_p: float = 0.9,
+                        endpoint: str = "/generate_response") -> Job:
+        """
+        Submit a generation job without waiting for it to finish
+        """
+        logger.info(f"Submitting job for input: {user_input[:50]}...")
+        return self._submit(
+            user_input=user_input,
+            max_length=max_length,
+            temperature=temperature,
+            top_p=top_p,
+            api_name=endpoint
+        )
+    
+    def generate_response(self, 
+                         user_input: str,
+                         max_length: float = 512,
+                         temperature: float = 0.7,
+                         top_p: float = 0.9,
+                         endpoint: str = "/generate_response",
+                         hedge: Optional[bool] = None,
+                         deadline: Optional['Deadline'] = None) -> str:
+        """
+        Generate response using specified endpoint. `hedge` overrides the
+        client's hedging default for this call; `deadline` bounds the whole
+        call including retries.
+        """
+        kwargs = dict(
+            user_input=user_input,
+            max_length=max_length,
+            temperature=temperature,
+            top_p=top_p,
+            api_name=endpoint
+        )
+        
+        try:
+            logger.info(f"Generating response for input: {user_input[:50]}...")
+            # Failed slots are marked broken and failing replicas get ejected,
+            # so retries land on a healthy slot or another upstream
+            tried = []
+            hedged = self.hedging.enabled if hedge is None else hedge
+            predict = self._hedged_predict if hedged else self._predict
+            result = self.retry_policy.call(lambda: predict(tried, deadline, **kwargs), deadline=deadline)
+            logger.info("Response generated successfully")
+            return result
+        except Exception as e:
+            logger.error(f"Error generating response: {e}")
+            raise
+    
+    def get_lambda_data(self, deadline: Optional['Deadline'] = None) -> tuple:
+        """Get data from the lambda endpoint"""
+        try:
+            logger.info("Fetching lambda data...")
+            tried = []
+            result = self.retry_policy.call(lambda: self._predict(tried, deadline, api_name="/lambda"),
+                                            deadline=deadline)
+            logger.info("Lambda data fetched successfully")
+            return result
+        except Exception as e:
+            logger.error(f"Error fetching lambda data: {e}")
+            raise
+
+class ModelWarmer:
+    """
+    Sends a few representative prompts to each generation endpoint of an
+    upstream so its model is warm before it serves traffic, recording the
+    first (cold) and following (warm) latencies
+    """
+    
+    def __init__(self, prompts: List[str], endpoints: List[str], max_length: float = 64,
+                 timeout: float = 300.0):
+        self.prompts = prompts
+        self.endpoints = endpoints
+        self.max_length = max_length
+        self.timeout = timeout
+        self.results = {}
+        self._warm = set()
+        self._locks = {}
+        self._lock = threading.Lock()
+    
+    def is_warm(self, upstream: 'Upstream') -> bool:
+        return upstream.url in self._warm
+    
+    def warm(self, client: 'GradioAPIClient', upstream: 'Upstream', wait: bool = False,
+             if_cold: bool = False) -> bool:
+        """
+        Run the warm-up prompts against one upstream; returns True if every
+        call to an endpoint it exposes succeeded. If a warm-up of the same
+        upstream is running, returns False at once, or with `wait` waits for
+        it. With `if_cold`, an upstream that is already warm is left alone
+        """
+        with self._lock:
+            lock = self._locks.setdefault(upstream.url, threading.Lock())
+        if not lock.acquire(blocking=wait):
+            return False  # already warming this upstream
+        try:
+            if (wait or if_cold) and self.is_warm(upstream):
+                return True
+            ok = True
+            for endpoint in self.endpoints:
+                latencies = []
+                for prompt in self.prompts:
+                    started = time.monotonic()
+                    try:
+                        job = client._submit(target=upstream, deadline=Deadline(self.timeout),
+                                             record_latency=False,
+                                             user_input=prompt, max_length=self.max_length,
+                                             temperature=DEFAULT_TEMPERATURE, top_p=DEFAULT_TOP_P,
+                                             api_name=endpoint)
+                        client._await(job, Deadline(self.timeout))
+                    except InvalidEndpointError:
+                        logger.info(f"Skipping warm-up of {endpoint}; {upstream.url} does not expose it")
+                        break
+                    except Exception as e:
+                        logger.warning(f"Warm-up of {endpoint} on {upstream.url} failed: {e}")
+                        ok = False
+                        break
+                    latencies.append(time.monotonic() - started)
+                if latencies:
+                    self.results[(upstream.url, endpoint)] = {
+                        'cold_ms': round(latencies[0] * 1000, 1),
+                        'warm_ms': round(sum(latencies[1:]) / len(latencies[1:]) * 1000, 1) if len(latencies) > 1 else None,
+                        'warmed_at': datetime.now().isoformat()
+                    }
+            if ok:
+                self._warm.add(upstream.url)
+                logger.info(f"Model warm-up finished for {upstream.url}")
+            return ok
+        finally:
+            lock.release()
+    
+    def warm_async(self, client: 'GradioAPIClient', upstream: 'Upstream', if_cold: bool = False):
+        threading.Thread(target=self.warm, args=(client, upstream), kwargs={'if_cold': if_cold},
+                         name='gradio-model-warmup', daemon=True).start()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'warm_upstreams': sorted(self._warm),
+            'latency': [dict(url=url, endpoint=endpoint, **result)
+                        for (url, endpoint), result in self.results.items()]
+        }
+
+class ConnectionSupervisor:
+    """
+    Background thread that pings every upstream on an interval and
+    reconnects broken pool slots ahead of time, so request threads never
+    pay the reconnection cost. Failed pings count against the upstream's
+    circuit breaker. Connected upstreams whose model warm-up has not
+    succeeded yet are warmed again.
+    """
+    
+    def __init__(self, client: 'GradioAPIClient', interval: float = 30.0, probe_timeout: float = 10.0):
+        self.client = client
+        self.interval = interval
+        self.probe_timeout = probe_timeout
+        self.runs = 0
+        self.reconnects = 0
+        self.last_run = None
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def run_once(self):
+        for upstream in self.client.upstreams:
+            try:
+                upstream.probe(timeout=self.probe_timeout)
+            except Exception as e:
+                logger.warning(f"Keepalive ping to {upstream.url} failed: {e}")
+                upstream.breaker.record_failure()
+                continue
+            self.reconnects += upstream.pool.refresh()
+            warmer = self.client.warmer
+            if warmer and not warmer.is_warm(upstream) and upstream.pool.any_client() is not None:
+                warmer.warm_async(self.client, upstream, if_cold=True)
+        self.runs += 1
+        self.last_run = datetime.now()
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Connection supervisor error: {e}")
+    
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='gradio-supervisor', daemon=True)
+        self._thread.start()
+        logger.info(f"Connection supervisor started (interval {self.interval}s)")
+    
+    def stop(self):
+        self._stop.set()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'interval': self.interval,
+            'runs': self.runs,
+            'reconnects': self.reconnects,
+            'last_run': self.last_run.isoformat() if self.last_run else None
+        }
+
+class QueueMonitor:
+    """
+    Background thread that polls every upstream's /queue/status so calls
+    can be routed to the shortest queue and shed when the queue ETA is
+    longer than the caller's deadline
+    """
+    
+    def __init__(self, client: 'GradioAPIClient', interval: float = 5.0, timeout: float = 5.0):
+        self.client = client
+        self.interval = interval
+        self.timeout = timeout
+        self.polls = 0
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = None
+        for upstream in client.upstreams:
+            upstream.queue_max_age = max(3 * interval, 10.0)
+    
+    def run_once(self):
+        for upstream in self.client.upstreams:
+            try:
+                upstream.poll_queue(timeout=self.timeout)
+                self.polls += 1
+            except Exception as e:
+                self.errors += 1
+                logger.debug(f"Queue status poll for {upstream.url} failed: {e}")
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Queue monitor error: {e}")
+    
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='gradio-queue-monitor', daemon=True)
+        self._thread.start()
+        logger.info(f"Queue monitor started (interval {self.interval}s)")
+    
+    def stop(self):
+        self._stop.set()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'interval': self.interval,
+            'polls': self.polls,
+            'errors': self.errors,
+            'shed_calls': self.client.shed_calls
+        }
+
+class SamplePool:
+    """
+    Background-refilled pool of /lambda results so /sample answers from
+    memory. Each sample is served once; the refill thread tops the pool up
+    at most once per refill interval, and only while the upstream is ready
+    """
+    
+    def __init__(self, client: 'GradioAPIClient', size: int = 8, refill_interval: float = 2.0,
+                 timeout: float = 60.0):
+        self.client = client
+        self.size = max(1, size)
+        self.refill_interval = refill_interval
+        self.timeout = timeout
+        self.served = 0
+        self.misses = 0
+        self.fetches = 0
+        self.errors = 0
+        self._samples = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def take(self) -> Optional[tuple]:
+        """A prefetched (question, response), or None when the pool is empty"""
+        with self._lock:
+            sample = self._samples.popleft() if self._samples else None
+            if sample is None:
+                self.misses += 1
+            else:
+                self.served += 1
+        self._wake.set()
+        return sample
+    
+    def refill_once(self) -> bool:
+        """Fetch one sample if the pool has room; returns whether one was added"""
+        with self._lock:
+            if len(self._samples) >= self.size:
+                return False
+        question, response = self.client.get_lambda_data(deadline=Deadline(self.timeout))
+        with self._lock:
+            self._samples.append((question, response))
+            self.fetches += 1
+        return True
+    
+    def _run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                full = len(self._samples) >= self.size
+            if full:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            if self.client.ready:
+                try:
+                    self.refill_once()
+                except Exception as e:
+                    self.errors += 1
+                    logger.warning(f"Sample prefetch failed: {e}")
+            self._stop.wait(self.refill_interval)
+    
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sample-prefetch', daemon=True)
+        self._thread.start()
+        logger.info(f"Sample prefetch started (pool size {self.size}, refill every {self.refill_interval}s)")
+    
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'running': self._thread is not None and self._thread.is_alive(),
+                'size': self.size,
+                'available': len(self._samples),
+                'refill_interval': self.refill_interval,
+                'served': self.served,
+                'misses': self.misses,
+                'fetches': self.fetches,
+                'errors': self.errors
+            }
+
+class JobRegistry:
+    """
+    Keeps track of submitted upstream jobs so callers can poll them by id
+    """
+    
+    def __init__(self, ttl: float = 600.0, max_jobs: int = 1000):
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _prune(self):
+        now = time.monotonic()
+        while self._jobs:
+            job_id, entry = next(iter(self._jobs.items()))
+            if now - entry['created'] > self.ttl or len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+                if not entry['job'].done():
+                    entry['job'].cancel()
+            else:
+                break
+    
+    def add(self, job: Job, meta: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {'job': job, 'meta': meta, 'created': time.monotonic()}
+            self._prune()
+        return job_id
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+    
+    def remove(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._jobs.pop(job_id, None)
+    
+    def active_count(self) -> int:
+        with self._lock:
+            return sum(1 for entry in self._jobs.values() if not entry['job'].done())
+
+def describe_job(job: Job) -> Dict[str, Any]:
+    """Summarize a Job's status, queue position and outcome"""
+    status = job.status()
+    info = {
+        'state': status.code.name.lower(),
+        'rank': status.rank,
+        'queue_size': status.queue_size,
+        'eta': status.eta,
+        'done': job.done()
+    }
+    if job.done() and not job.future.cancelled():
+        error = job.future.exception()
+        if error is not None:
+            info['state'] = 'failed'
+            info['error'] = str(error)
+        else:
+            info['state'] = 'completed'
+            info['response'] = job.result()
+    elif job.done():
+        info['state'] = 'cancelled'
+    return info
+
+# Raw zlib/zstd dictionary of phrasing common in Vietnamese legal answers.
+# Compressors match against it, so even short answers compress well; the
+# most frequent phrases come last, where matches are cheapest
+LEGAL_COMPRESSION_DICT = (
+    '{"value": "", "stored_at": }'
+    'căn cứ pháp lý; hồ sơ gồm; thủ tục thực hiện; thời hạn giải quyết; lệ phí; mức phạt tiền từ '
+    'đồng đến đồng; xử phạt vi phạm hành chính; truy cứu trách nhiệm hình sự; bồi thường thiệt hại; '
+    'Ủy ban nhân dân cấp xã; Ủy ban nhân dân cấp huyện; Ủy ban nhân dân cấp tỉnh; Tòa án nhân dân; '
+    'cơ quan nhà nước có thẩm quyền; giấy chứng nhận quyền sử dụng đất; quyền sở hữu nhà ở; '
+    'Luật Đất đai năm 2024; Luật Hôn nhân và gia đình năm 2014; Luật Doanh nghiệp năm 2020; '
+    'Bộ luật Hình sự năm 2015; Bộ luật Dân sự năm 2015; Bộ luật Lao động năm 2019; '
+    'bảo hiểm xã hội; bảo hiểm y tế; bảo hiểm thất nghiệp; tiền lương; thời giờ làm việc; '
+    'người sử dụng lao động; người lao động; hợp đồng lao động; đơn phương chấm dứt hợp đồng; '
+    'quyền và nghĩa vụ; trong trường hợp; theo quy định của pháp luật; được quy định tại; '
+    'Nghị định; Thông tư; khoản; điểm; Theo quy định tại Điều '
+).encode('utf-8')
+
+def json_bytes(value: Any) -> bytes:
+    """UTF-8 JSON, the form answers are cached and spliced into responses in"""
+    return json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+class AnswerCodec:
+    """
+    Turns cache entries into bytes: JSON, compressed with zlib or zstd
+    primed with a shared dictionary once it is at least min_size bytes.
+    A one-byte header records how each entry was stored, and running
+    totals give the compression ratio of everything written so far
+    """
+    
+    RAW, ZLIB, ZSTD = b'j', b'z', b's'
+    
+    def __init__(self, compression: str = 'zlib', level: int = 6, min_size: int = 256,
+                 dictionary: bytes = LEGAL_COMPRESSION_DICT):
+        if compression not in ('none', 'zlib', 'zstd'):
+            raise ValueError(f"Unknown compression: {compression}")
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError("CACHE_COMPRESSION=zstd requires the zstandard package")
+        self.compression = compression
+        self.level = level
+        self.min_size = min_size
+        self.dictionary = dictionary
+        self._local = threading.local()  # zstd (de)compressors are not thread-safe
+        self._lock = threading.Lock()
+        self.raw_bytes = 0
+        self.encoded_bytes = 0
+    
+    def _zstd(self) -> tuple:
+        if not hasattr(self._local, 'zstd'):
+            zdict = zstandard.ZstdCompressionDict(self.dictionary, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+            self._local.zstd = (zstandard.ZstdCompressor(level=self.level, dict_data=zdict),
+                                zstandard.ZstdDecompressor(dict_data=zdict))
+        return self._local.zstd
+    
+    def compress(self, raw: bytes) -> bytes:
+        if self.compression == 'none' or len(raw) < self.min_size:
+            return self.RAW + raw
+        if self.compression == 'zstd':
+            return self.ZSTD + self._zstd()[0].compress(raw)
+        compressor = zlib.compressobj(self.level, zdict=self.dictionary)
+        return self.ZLIB + compressor.compress(raw) + compressor.flush()
+    
+    def decompress(self, data: bytes) -> bytes:
+        marker, body = data[:1], data[1:]
+        if marker == self.ZLIB:
+            decompressor = zlib.decompressobj(zdict=self.dictionary)
+            return decompressor.decompress(body) + decompressor.flush()
+        if marker == self.ZSTD:
+            if zstandard is None:
+                raise ValueError("Cached entry is zstd-compressed but zstandard is not installed")
+            return self._zstd()[1].decompress(body)
+        if marker == self.RAW:
+            return body
+        return data  # Plain JSON written before entries were encoded
+    
+    def encode(self, value: Any) -> bytes:
+        return self.encode_json(json_bytes(value))
+    
+    def encode_json(self, raw: bytes) -> bytes:
+        """Store JSON that is already serialized"""
+        data = self.compress(raw)
+        with self._lock:
+            self.raw_bytes += len(raw)
+            self.encoded_bytes += len(data)
+        return data
+    
+    def decode(self, data: bytes) -> Any:
+        return json.loads(self.decompress(data))
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'compression': self.compression,
+                'raw_bytes_written': self.raw_bytes,
+                'stored_bytes_written': self.encoded_bytes,
+                'written_compression_ratio': (round(self.raw_bytes / self.encoded_bytes, 3)
+                                              if self.encoded_bytes else None)
+            }
+
+class CacheBackendError(Exception):
+    """Raised when a cache backend returns an error reply"""
+
+class CacheBackend:
+    """
+    Storage interface behind ResponseCache. Values are bytes (encoded by an
+    AnswerCodec) and every entry carries its own TTL
+    """
+    
+    name = 'base'
+    
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+    
+    def get_with_ttl(self, key: str) -> Optional[tuple]:
+        """(value, seconds left) or None; backends that cannot tell report None for the TTL"""
+        value = self.get(key)
+        return None if value is None else (value, None)
+    
+    def set(self, key: str, value: bytes, ttl: float):
+        raise NotImplementedError
+    
+    def delete(self, key: str):
+        raise NotImplementedError
+    
+    def clear(self):
+        raise NotImplementedError
+    
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': self.name}
+
+class CountMinSketch:
+    """
+    Compact frequency estimator: `depth` rows of saturating 4-bit counters.
+    Every counter is halved after sample_size increments so old popularity
+    fades
+    """
+    
+    def __init__(self, width: int, depth: int = 4, sample_size: Optional[int] = None):
+        self.width = 1 << max(4, (max(1, width) - 1).bit_length())
+        self.depth = depth
+        self.sample_size = sample_size or 10 * self.width
+        self._mask = self.width - 1
+        self._rows = [bytearray(self.width) for _ in range(depth)]
+        self._additions = 0
+        self.resets = 0
+    
+    def _indexes(self, key) -> List[int]:
+        h = hash(key)
+        h1, h2 = h & 0xFFFFFFFF, ((h >> 32) & 0xFFFFFFFF) | 1
+        return [(h1 + i * h2) & self._mask for i in range(self.depth)]
+    
+    def increment(self, key):
+        for row, index in zip(self._rows, self._indexes(key)):
+            if row[index] < 15:
+                row[index] += 1
+        self._additions += 1
+        if self._additions >= self.sample_size:
+            self._rows = [bytearray(c >> 1 for c in row) for row in self._rows]
+            self._additions //= 2
+            self.resets += 1
+    
+    def estimate(self, key) -> int:
+        return min(row[index] for row, index in zip(self._rows, self._indexes(key)))
+
+class LRUPolicy:
+    """Evicts the least recently used key"""
+    
+    name = 'lru'
+    
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._order = OrderedDict()
+    
+    def access(self, key):
+        self._order.move_to_end(key)
+    
+    def admit(self, key) -> List[str]:
+        """Track a new key; returns the keys to evict"""
+        self._order[key] = None
+        victims = []
+        while len(self._order) > self.capacity:
+            victims.append(self._order.popitem(last=False)[0])
+        return victims
+    
+    def evict_one(self) -> Optional[str]:
+        """Stop tracking and return the next key to evict, or None when empty"""
+        return self._order.popitem(last=False)[0] if self._order else None
+    
+    def remove(self, key):
+        self._order.pop(key, None)
+    
+    def clear(self):
+        self._order.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {'policy': self.name}
+
+class WTinyLFUPolicy:
+    """
+    W-TinyLFU: new keys enter a small LRU window. A key leaving the window
+    only enters the main segmented LRU if the frequency sketch rates it
+    above the main cache's eviction candidate, so one-off questions and
+    /batch scans cannot flush popular answers
+    """
+    
+    name = 'tinylfu'
+    
+    def __init__(self, capacity: int, window_ratio: float = 0.01, protected_ratio: float = 0.8):
+        self.capacity = capacity
+        self.window_capacity = max(1, int(capacity * window_ratio))
+        self.main_capacity = max(1, capacity - self.window_capacity)
+        self.protected_capacity = int(self.main_capacity * protected_ratio)
+        self.sketch = CountMinSketch(capacity)
+        self._window = OrderedDict()
+        self._probation = OrderedDict()
+        self._protected = OrderedDict()
+        self.admitted = 0
+        self.rejected = 0
+    
+    def access(self, key):
+        self.sketch.increment(key)
+        if key in self._window:
+            self._window.move_to_end(key)
+        elif key in self._protected:
+            self._protected.move_to_end(key)
+        elif key in self._probation:
+            del self._probation[key]
+            self._protected[key] = None
+            if len(self._protected) > self.protected_capacity:
+                demoted = self._protected.popitem(last=False)[0]
+                self._probation[demoted] = None
+    
+    def admit(self, key) -> List[str]:
+        """Track a new key; returns the keys to evict, which may include the new key itself"""
+        self.sketch.increment(key)
+        self._window[key] = None
+        if len(self._window) <= self.window_capacity:
+            return []
+        candidate = self._window.popitem(last=False)[0]
+        if len(self._probation) + len(self._protected) < self.main_capacity:
+            self._probation[candidate] = None
+            return []
+        segment = self._probation if self._probation else self._protected
+        victim = next(iter(segment))
+        if self.sketch.estimate(candidate) > self.sketch.estimate(victim):
+            del segment[victim]
+            self._probation[candidate] = None
+            self.admitted += 1
+            return [victim]
+        self.rejected += 1
+        return [candidate]
+    
+    def evict_one(self) -> Optional[str]:
+        """Stop tracking and return the next key to evict: probation first, then window, then protected"""
+        for segment in (self._probation, self._window, self._protected):
+            if segment:
+                return segment.popitem(last=False)[0]
+        return None
+    
+    def remove(self, key):
+        for segment in (self._window, self._probation, self._protected):
+            if key in segment:
+                del segment[key]
+                return
+    
+    def clear(self):
+        self._window.clear()
+        self._probation.clear()
+        self._protected.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'policy': self.name,
+            'window': len(self._window),
+            'probation': len(self._probation),
+            'protected': len(self._protected),
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'sketch_resets': self.sketch.resets
+        }
+
+EVICTION_POLICIES = {'lru': LRUPolicy, 'tinylfu': WTinyLFUPolicy}
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    Per-process store with per-entry expiry, bounded by both an entry count
+    and a byte budget, with a pluggable eviction policy (lru or tinylfu)
+    """
+    
+    name = 'memory'
+    
+    def __init__(self, max_entries: int = 1024, policy: str = 'lru', max_bytes: int = 64 * 1024 * 1024):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self._entries = {}  # key -> (expires_at, value)
+        self._bytes = 0
+        self._policy = EVICTION_POLICIES[policy](self.max_entries)
+        self._lock = threading.Lock()
+        self.evictions = 0
+    
+    @staticmethod
+    def _size(key: str, value: bytes) -> int:
+        return len(key) + len(value)
+    
+    def _discard(self, key: str):
+        """Drop an entry the policy no longer tracks; caller holds the lock"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= self._size(key, entry[1])
+    
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self.get_with_ttl(key)
+        return None if entry is None else entry[0]
+    
+    def get_with_ttl(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            remaining = entry[0] - time.monotonic()
+            if remaining <= 0:
+                self._discard(key)
+                self._policy.remove(key)
+                return None
+            self._policy.access(key)
+            return entry[1], remaining
+    
+    def set(self, key: str, value: bytes, ttl: float):
+        with self._lock:
+            exists = key in self._entries
+            self._discard(key)
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._bytes += self._size(key, value)
+            if exists:
+                self._policy.access(key)
+            else:
+                for victim in self._policy.admit(key):
+                    self._discard(victim)
+                    self.evictions += 1
+            while self._bytes > self.max_bytes:
+                victim = self._policy.evict_one()
+                if victim is None:
+                    break
+                self._discard(victim)
+                self.evictions += 1
+    
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+                self._policy.remove(key)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._policy.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                'backend': self.name,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions
+            }
+            stats.update(self._policy.stats())
+            return stats
+
+class _RedisConnection:
+    """A single RESP connection to a Redis-compatible server"""
+    
+    def __init__(self, host: str, port: int, timeout: float):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile('rb')
+    
+    @staticmethod
+    def encode(args) -> bytes:
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+    
+    def execute(self, *args) -> Any:
+        self.sock.sendall(self.encode(args))
+        return self.read_reply()
+    
+    def read_reply(self) -> Any:
+        line = self.reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise ConnectionError('Redis connection closed')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode('utf-8')
+        if kind == b'-':
+            raise CacheBackendError(payload.decode('utf-8', 'replace'))
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError('Redis connection closed')
+            return data[:-2]
+        if kind == b'*':
+            length = int(payload)
+            return None if length < 0 else [self.read_reply() for _ in range(length)]
+        raise CacheBackendError(f"Unexpected Redis reply: {line[:40]!r}")
+    
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Shared store speaking the Redis protocol, so every worker and node sees
+    the same answers. Keys are hashed under a prefix; the server's maxmemory
+    setting is its byte budget
+    """
+    
+    name = 'redis'
+    
+    def __init__(self, url: str = 'redis://localhost:6379/0', prefix: str = 'legalqa:',
+                 timeout: float = 1.0, max_idle: int = 8):
+        parsed = urllib.parse.urlparse(url)
+        if parsed.scheme != 'redis':
+            raise ValueError(f"Unsupported cache URL scheme: {parsed.scheme}")
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = urllib.parse.unquote(parsed.password) if parsed.password else None
+        self.username = urllib.parse.unquote(parsed.username) if parsed.username else None
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.prefix = prefix
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=max(1, max_idle))
+    
+    def _open(self) -> _RedisConnection:
+        conn = _RedisConnection(self.host, self.port, self.timeout)
+        try:
+            if self.password:
+                if self.username:
+                    conn.execute('AUTH', self.username, self.password)
+                else:
+                    conn.execute('AUTH', self.password)
+            if self.db:
+                conn.execute('SELECT', self.db)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+    
+    @contextmanager
+    def _connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+        try:
+            yield conn
+        except CacheBackendError:
+            # An error reply leaves the stream in sync, so the socket is reusable
+            self._release(conn)
+            raise
+        except BaseException:
+            # Broken or desynchronised socket; never hand it out again
+            conn.close()
+            raise
+        self._release(conn)
+    
+    def _release(self, conn: _RedisConnection):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+    
+    def _key(self, key: str) -> str:
+        return self.prefix + hashlib.sha256(key.encode('utf-8')).hexdigest()
+    
+    def execute(self, *args) -> Any:
+        with self._connection() as conn:
+            return conn.execute(*args)
+    
+    def get(self, key: str) -> Optional[bytes]:
+        return self.execute('GET', self._key(key))
+    
+    def set(self, key: str, value: bytes, ttl: float):
+        self.execute('SET', self._key(key), value, 'PX', max(1, int(ttl * 1000)))
+    
+    def delete(self, key: str):
+        self.execute('DEL', self._key(key))
+    
+    def clear(self):
+        cursor = '0'
+        while True:
+            cursor, keys = self.execute('SCAN', cursor, 'MATCH', self.prefix + '*', 'COUNT', 500)
+            cursor = cursor.decode('utf-8')
+            if keys:
+                self.execute('DEL', *keys)
+            if cursor == '0':
+                break
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'backend': self.name,
+            'server': f"{self.host}:{self.port}/{self.db}",
+            'prefix': self.prefix,
+            'idle_connections': self._idle.qsize()
+        }
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Persistent store in a single SQLite file that survives restarts and is
+    shared by workers on the same host. Opening it reads no entries. The
+    stored bytes are totalled by triggers in the database itself, so every
+    worker sees the writes of the others; once they exceed max_bytes,
+    expired and then least recently used entries are compacted away
+    """
+    
+    name = 'sqlite'
+    
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, compact_ratio: float = 0.8):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.compact_ratio = compact_ratio
+        self.compactions = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._db.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                self._db.execute('CREATE TABLE IF NOT EXISTS answers ('
+                                 'key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, '
+                                 'expires_at REAL NOT NULL, accessed_at REAL NOT NULL)')
+                self._db.execute('CREATE INDEX IF NOT EXISTS answers_expires ON answers (expires_at)')
+                self._db.execute('CREATE INDEX IF NOT EXISTS answers_accessed ON answers (accessed_at)')
+                self._db.execute('CREATE TABLE IF NOT EXISTS answers_size ('
+                                 'id INTEGER PRIMARY KEY CHECK (id = 1), bytes INTEGER NOT NULL)')
+                self._db.execute('INSERT OR IGNORE INTO answers_size (id, bytes) '
+                                 'SELECT 1, COALESCE(SUM(size), 0) FROM answers')
+                self._db.execute('CREATE TRIGGER IF NOT EXISTS answers_size_insert AFTER INSERT ON answers '
+                                 'BEGIN UPDATE answers_size SET bytes = bytes + NEW.size; END')
+                self._db.execute('CREATE TRIGGER IF NOT EXISTS answers_size_update AFTER UPDATE OF size ON answers '
+                                 'BEGIN UPDATE answers_size SET bytes = bytes + NEW.size - OLD.size; END')
+                self._db.execute('CREATE TRIGGER IF NOT EXISTS answers_size_delete AFTER DELETE ON answers '
+                                 'BEGIN UPDATE answers_size SET bytes = bytes - OLD.size; END')
+                self._db.execute('DELETE FROM answers WHERE expires_at <= ?', (time.time(),))
+                self._db.execute('COMMIT')
+            except sqlite3.Error:
+                self._db.execute('ROLLBACK')
+                raise
+    
+    def _stored_bytes(self) -> int:
+        """Bytes stored by every worker sharing the file; caller holds the lock"""
+        return self._db.execute('SELECT bytes FROM answers_size').fetchone()[0]
+    
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self.get_with_ttl(key)
+        return None if entry is None else entry[0]
+    
+    def get_with_ttl(self, key: str) -> Optional[tuple]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT value, expires_at FROM answers WHERE key = ?', (key,)).fetchone()
+            if row is None or row[1] <= now:
+                return None
+            self._db.execute('UPDATE answers SET accessed_at = ? WHERE key = ?', (now, key))
+        return bytes(row[0]), row[1] - now
+    
+    def set(self, key: str, value: bytes, ttl: float):
+        payload = value
+        now = time.time()
+        with self._lock:
+            # An upsert rather than INSERT OR REPLACE, whose implicit delete would skip the size trigger
+            self._db.execute('INSERT INTO answers (key, value, size, expires_at, accessed_at) '
+                             'VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+                             'value = excluded.value, size = excluded.size, '
+                             'expires_at = excluded.expires_at, accessed_at = excluded.accessed_at',
+                             (key, payload, len(payload), now + ttl, now))
+            if self._stored_bytes() > self.max_bytes:
+                self._compact()
+    
+    def _compact(self):
+        """Drop expired, then least recently used, entries until under the budget; caller holds the lock"""
+        target = self.max_bytes * self.compact_ratio
+        removed = self._db.execute('DELETE FROM answers WHERE expires_at <= ?', (time.time(),)).rowcount
+        stored = self._stored_bytes()
+        while stored > target:
+            rows = self._db.execute('SELECT key, size FROM answers ORDER BY accessed_at LIMIT 256').fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                stored -= size
+                removed += self._db.execute('DELETE FROM answers WHERE key = ?', (key,)).rowcount
+                if stored <= target:
+                    break
+            stored = self._stored_bytes()
+        self._db.execute('PRAGMA incremental_vacuum')
+        self.evictions += removed
+        self.compactions += 1
+        logger.info(f"Compacted answer cache {self.path}: removed {removed} entries, {stored} bytes left")
+    
+    def delete(self, key: str):
+        with self._lock:
+            self._db.execute('DELETE FROM answers WHERE key = ?', (key,))
+    
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM answers')
+            self._db.execute('PRAGMA incremental_vacuum')
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._db.execute('SELECT COUNT(*) FROM answers').fetchone()[0]
+            return {
+                'backend': self.name,
+                'path': self.path,
+                'entries': entries,
+                'bytes': self._stored_bytes(),
+                'max_bytes': self.max_bytes,
+                'compactions': self.compactions,
+                'evictions': self.evictions
+            }
+
+class TieredCacheBackend(CacheBackend):
+    """
+    A fast front store backed by a persistent one: reads fall through to
+    the persistent tier and promote what they find, writes go to both
+    """
+    
+    name = 'tiered'
+    
+    def __init__(self, front: CacheBackend, back: CacheBackend):
+        self.front = front
+        self.back = back
+        self.promotions = 0
+    
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self.get_with_ttl(key)
+        return None if entry is None else entry[0]
+    
+    def get_with_ttl(self, key: str) -> Optional[tuple]:
+        entry = self.front.get_with_ttl(key)
+        if entry is not None:
+            return entry
+        entry = self.back.get_with_ttl(key)
+        if entry is not None and entry[1]:
+            self.front.set(key, entry[0], entry[1])
+            self.promotions += 1
+        return entry
+    
+    def set(self, key: str, value: bytes, ttl: float):
+        self.front.set(key, value, ttl)
+        self.back.set(key, value, ttl)
+    
+    def delete(self, key: str):
+        self.front.delete(key)
+        self.back.delete(key)
+    
+    def clear(self):
+        self.front.clear()
+        self.back.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'backend': f"{self.front.name}+{self.back.name}",
+            'promotions': self.promotions,
+            'front': self.front.stats(),
+            'persistent': self.back.stats()
+        }
 
-app = Flask(__name__, template_folder='templates', static_folder='static')
+def create_cache_backend(kind: str, **options) -> CacheBackend:
+    """Build the cache backend named by CACHE_BACKEND"""
+    kind = kind.lower()
+    if kind == 'memory':
+        return MemoryCacheBackend(max_entries=options.get('max_entries', 1024),
+                                  policy=options.get('policy', 'lru'),
+                                  max_bytes=options.get('memory_max_bytes', 64 * 1024 * 1024))
+    if kind == 'redis':
+        return RedisCacheBackend(url=options.get('url', 'redis://localhost:6379/0'),
+                                 prefix=options.get('prefix', 'legalqa:'),
+                                 timeout=options.get('timeout', 1.0))
+    if kind == 'sqlite':
+        return SQLiteCacheBackend(options.get('path', '.gradio_cache/answers.sqlite3'),
+                                  max_bytes=options.get('max_bytes', 256 * 1024 * 1024))
+    raise ValueError(f"Unknown cache backend: {kind}")
 
-# Enhanced CORS configuration
-CORS(app, 
-     origins=['*'],  # Allow all origins, configure specifically for production
-     methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
-     allow_headers=['Content-Type', 'Authorization', 'X-API-Key'],
-     supports_credentials=True
-)
+# Precompiled canonicalization patterns for cache keys
+_NON_WORD_RE = re.compile(r'[\W_]+')
+_LEADING_FILLER_RE = re.compile(
+    r'^(?:(?:chào\s+)?(?:luật sư|ad|admin|bạn)\s+(?:ơi\s+)?)?(?:(?:làm ơn|vui lòng)\s+)?'
+    r'(?:(?:xin\s+)?cho(?:\s+(?:em|tôi|mình|cháu|con|anh|chị))?|xin'
+    r'|(?:em|tôi|mình|cháu|con|anh|chị)\s+(?:xin|muốn))'
+    r'\s+(?:được\s+)?hỏi\s+(?:(?:là|về)\s+)?')
+_TRAILING_FILLER_RE = re.compile(
+    r'(?:\s+(?:ạ|à|ah|nhé|nhỉ|nha|vậy|thế|(?:xin\s+)?cảm ơn(?:\s+(?:ạ|nhiều))?|thanks?))+$')
 
-class GradioAPIClient:
+# Semantic matching ignores words that do not change which legal answer
+# fits ("bộ luật" vs "luật", "việt nam", question words), but numbers
+# (articles, years, amounts) must match exactly
+_SEMANTIC_FILLER_RE = re.compile(
+    r'(?<!\S)(?:(?:nước\s+)?(?:cộng hòa xã hội chủ nghĩa\s+)?việt nam|(?:như\s+)?thế nào|ra sao'
+    r'|là gì|những gì|gì|các|những|khi|thì|là|của|về|bộ(?=\s+luật)|năm(?=\s+\d))(?!\S)')
+_NUMBER_RE = re.compile(r'\d+')
+
+def canonicalize_question(text: str, fold_stopwords: bool = False) -> str:
     """
-    A client class for interacting with any Gradio API
+    Canonical form of a question for cache keys: NFC diacritics, casefolded,
+    punctuation stripped and whitespace collapsed. With fold_stopwords, polite
+    openers ("cho em hỏi") and closing particles ("ạ", "nhé") are dropped too
     """
+    text = unicodedata.normalize('NFC', text).casefold()
+    text = _NON_WORD_RE.sub(' ', text).strip()
+    if fold_stopwords:
+        text = _TRAILING_FILLER_RE.sub('', _LEADING_FILLER_RE.sub('', text))
+    return text
+
+def request_key(user_input: str, max_length: float, temperature: float, top_p: float,
+                endpoint: str, fold_stopwords: bool = False) -> str:
+    """Canonical identity of a generation request, shared by caching and coalescing"""
+    return json.dumps([canonicalize_question(user_input, fold_stopwords), float(max_length),
+                       float(temperature), float(top_p), endpoint], ensure_ascii=False)
+
+class ResponseCache:
+    """
+    Answer cache for the generation routes, keyed on the normalized question
+    and the generation parameters. Storage is delegated to a CacheBackend;
+    backend failures degrade to cache misses.
     
-    def __init__(self, api_url: str):
-        self.api_url = api_url
-        self.client = None
-        self.last_connected = None
-        self.connection_lock = threading.Lock()
-        self._connect()
+    Entries stay stored for `stale_while_revalidate` or `stale_if_error`
+    seconds past their TTL (whichever is longer) so expired answers can be
+    served while a background refresh runs, or when the upstream fails.
+    """
     
-    def _connect(self):
-        """Establish connection to the API"""
-        with self.connection_lock:
+    def __init__(self, backend: CacheBackend, ttl: float = 3600.0, fold_stopwords: bool = False,
+                 stale_while_revalidate: float = 0.0, stale_if_error: float = 0.0,
+                 refresh_workers: int = 2, codec: Optional[AnswerCodec] = None):
+        self.backend = backend
+        self.codec = codec or AnswerCodec()
+        self.ttl = ttl
+        self.fold_stopwords = fold_stopwords
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_if_error = stale_if_error
+        self._refresher = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, refresh_workers),
+                                                                thread_name_prefix='cache-refresh')
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.counts = {'hit': 0, 'stale': 0, 'stale_error': 0, 'miss': 0, 'bypass': 0}
+        self.errors = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+    
+    def normalize(self, text: str) -> str:
+        return canonicalize_question(text, self.fold_stopwords)
+    
+    def make_key(self, user_input: str, max_length: float, temperature: float,
+                 top_p: float, endpoint: str) -> str:
+        return request_key(user_input, max_length, temperature, top_p, endpoint, self.fold_stopwords)
+    
+    # Entries are written as {"stored_at": ..., "value": ...} so the answer's
+    # JSON can be sliced out and sent as-is, without parsing it
+    ENVELOPE_HEAD = b'{"stored_at": '
+    ENVELOPE_VALUE = b', "value": '
+    
+    def _unpack(self, raw: bytes) -> Optional[tuple]:
+        if raw.startswith(self.ENVELOPE_HEAD) and raw.endswith(b'}'):
+            head, _, value = raw[len(self.ENVELOPE_HEAD):-1].partition(self.ENVELOPE_VALUE)
+            return value, float(head)
+        entry = json.loads(raw)  # Written with another key order
+        if not isinstance(entry, dict) or 'stored_at' not in entry:
+            return None  # Written before entries carried their age
+        return json_bytes(entry['value']), entry['stored_at']
+    
+    def get_json(self, key: str) -> Optional[tuple]:
+        """(answer as JSON bytes, age in seconds) of a stored answer, fresh or stale, or None"""
+        try:
+            data = self.backend.get(key)
+            entry = None if data is None else self._unpack(self.codec.decompress(data))
+        except (OSError, ValueError, zlib.error, CacheBackendError, sqlite3.Error) as e:
+            logger.warning(f"Cache {self.backend.name} read failed: {e}")
+            with self._lock:
+                self.errors += 1
+            return None
+        if entry is None:
+            return None
+        return entry[0], max(0.0, time.time() - entry[1])
+    
+    def get(self, key: str) -> Optional[tuple]:
+        """(value, age in seconds) of a stored answer, fresh or stale, or None"""
+        cached = self.get_json(key)
+        return None if cached is None else (json.loads(cached[0]), cached[1])
+    
+    def is_fresh(self, age: float) -> bool:
+        return age < self.ttl
+    
+    def can_revalidate(self, age: float) -> bool:
+        return age < self.ttl + self.stale_while_revalidate
+    
+    def can_serve_on_error(self, age: float) -> bool:
+        return age < self.ttl + self.stale_if_error
+    
+    def set(self, key: str, value: Any):
+        entry = self.ENVELOPE_HEAD + repr(time.time()).encode() + self.ENVELOPE_VALUE + json_bytes(value) + b'}'
+        try:
+            self.backend.set(key, self.codec.encode_json(entry),
+                             self.ttl + max(self.stale_while_revalidate, self.stale_if_error))
+        except (OSError, ValueError, CacheBackendError, sqlite3.Error) as e:
+            logger.warning(f"Cache {self.backend.name} write failed: {e}")
+            with self._lock:
+                self.errors += 1
+    
+    def record(self, status: str):
+        """Count how a lookup was answered: hit, stale, stale_error, miss or bypass"""
+        with self._lock:
+            self.counts[status] += 1
+    
+    def refresh(self, key: str, fn: Callable[[], Any]) -> bool:
+        """Run fn in the background unless a refresh of this key is already running"""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            self.refreshes += 1
+        
+        def run():
             try:
-                self.client = Client(self.api_url)
-                self.last_connected = datetime.now()
-                logger.info(f"Successfully connected to API: {self.api_url}")
-                return True
+                fn()
             except Exception as e:
-                logger.error(f"Failed to connect to API: {e}")
-                self.client = None
-                return False
+                logger.warning(f"Background cache refresh failed: {e}")
+                with self._lock:
+                    self.refresh_failures += 1
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+        
+        self._refresher.submit(run)
+        return True
     
-    def _ensure_connection(self):
-        """Ensure we have a valid connection"""
-        if self.client is None:
-            if not self._connect():
-                raise ConnectionError("Unable to connect to Gradio API")
+    def clear(self):
+        self.backend.clear()
     
-    def generate_response(self, 
-                         user_input: str,
-                         max_length: float = 512,
-                         temperature: float = 0.7,
-                         top_p: float = 0.9,
-                         endpoint: str = "/generate_response") -> str:
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            served = self.counts['hit'] + self.counts['stale']
+            lookups = served + self.counts['miss'] + self.counts['stale_error']
+            stats = {
+                'ttl': self.ttl,
+                'stale_while_revalidate': self.stale_while_revalidate,
+                'stale_if_error': self.stale_if_error,
+                'hits': self.counts['hit'],
+                'stale_hits': self.counts['stale'],
+                'stale_on_error': self.counts['stale_error'],
+                'misses': self.counts['miss'],
+                'bypasses': self.counts['bypass'],
+                'errors': self.errors,
+                'refreshes': self.refreshes,
+                'refresh_failures': self.refresh_failures,
+                'refreshing': len(self._refreshing),
+                'hit_rate': round(served / lookups, 4) if lookups else None
+            }
+        stats.update(self.codec.stats())
+        stats.update(self.backend.stats())
+        return stats
+
+class SemanticCache:
+    """
+    Answers reworded questions from earlier ones. Questions are embedded as
+    signed hashed character n-grams and matched by cosine similarity against
+    a NumPy matrix of cached questions; only entries generated with the same
+    parameters and containing the same numbers (article numbers, years,
+    amounts) are eligible. Answers are stored encoded, and the oldest
+    rows are evicted once max_entries or the max_bytes budget is reached.
+    The matrix search runs outside the lock; only the winning rows are
+    re-checked under it
+    """
+    
+    def __init__(self, threshold: float = 0.9, dim: int = 256, max_entries: int = 10000,
+                 ttl: float = 3600.0, ngram: int = 3, max_bytes: int = 32 * 1024 * 1024,
+                 codec: Optional[AnswerCodec] = None):
+        self.threshold = threshold
+        self.dim = dim
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.ngram = ngram
+        self.codec = codec or AnswerCodec()
+        capacity = min(1024, self.max_entries)
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._groups = np.full(capacity, -1, dtype=np.int32)
+        self._numbers = np.zeros(capacity, dtype=np.int64)
+        self._expires = np.zeros(capacity, dtype=np.float64)
+        self._values = [None] * capacity
+        self._size = 0  # Rows in use or freed; searches only look at these
+        self._live = OrderedDict()  # Live row -> ((question, params), raw size), oldest first
+        self._rows = {}  # (question, params) -> live row
+        self._free = []
+        self._bytes = 0
+        self._raw_bytes = 0  # JSON size of the live answers before encoding
+        self._group_ids = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def numbers_key(text: str) -> int:
+        """Hash of the numbers in a question, in order; candidates must share it"""
+        return hash(tuple(_NUMBER_RE.findall(text)))
+    
+    def embed(self, text: str) -> 'np.ndarray':
+        """Unit-length hashed n-gram vector for a normalized question"""
+        text = ' '.join(_SEMANTIC_FILLER_RE.sub(' ', text).split())
+        padded = f" {text} "
+        features = [padded[i:i + self.ngram] for i in range(len(padded) - self.ngram + 1)]
+        features.extend(text.split())
+        hashes = [zlib.crc32(feature.encode('utf-8')) for feature in features]
+        vector = np.bincount([h % self.dim for h in hashes],
+                             weights=[1.0 if h & 0x80000000 else -1.0 for h in hashes],
+                             minlength=self.dim).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def _grow(self):
+        capacity = min(self.max_entries, len(self._values) * 2)
+        extra = capacity - len(self._values)
+        self._vectors = np.vstack([self._vectors, np.zeros((extra, self.dim), dtype=np.float32)])
+        self._groups = np.concatenate([self._groups, np.full(extra, -1, dtype=np.int32)])
+        self._numbers = np.concatenate([self._numbers, np.zeros(extra, dtype=np.int64)])
+        self._expires = np.concatenate([self._expires, np.zeros(extra, dtype=np.float64)])
+        self._values.extend([None] * extra)
+    
+    def _score(self, row: int, query: 'np.ndarray', number: int, group: int) -> float:
+        """Current score of one row for a query; caller holds the lock"""
+        if (self._values[row] is None or self._groups[row] != group or self._numbers[row] != number
+                or self._expires[row] <= time.monotonic()):
+            return -1.0
+        return float(self._vectors[row] @ query)
+    
+    def lookup_many(self, texts: List[str], params: tuple, as_json: bool = False) -> List[tuple]:
         """
-        Generate response using specified endpoint
+        (answer, similarity) per question in one matrix product; answer is
+        None below the threshold, and JSON bytes when as_json is set
         """
-        self._ensure_connection()
+        if not texts:
+            return []
+        queries = np.stack([self.embed(text) for text in texts])
+        numbers = np.array([self.numbers_key(text) for text in texts], dtype=np.int64)
+        with self._lock:
+            group = self._group_ids.get(params)
+            n = self._size
+            vectors, groups, numbers_by_row, expires = self._vectors, self._groups, self._numbers, self._expires
+        if group is None or n == 0:
+            return [(None, -1.0)] * len(texts)
         
+        # Rows may be rewritten while this runs; the winners are re-scored below
+        scores = vectors[:n] @ queries.T
+        scores[(groups[:n] != group) | (expires[:n] <= time.monotonic())] = -1.0
+        scores[numbers_by_row[:n, None] != numbers[None, :]] = -1.0
+        best = scores.argmax(axis=0)
+        
+        matches = []
+        with self._lock:
+            for i, row in enumerate(best):
+                score = self._score(int(row), queries[i], int(numbers[i]), group)
+                matches.append((self._values[row] if score >= self.threshold else None, score))
+        decode = self.codec.decompress if as_json else self.codec.decode
+        return [(None if data is None else decode(data), score) for data, score in matches]
+    
+    def lookup(self, text: str, params: tuple, as_json: bool = False) -> tuple:
+        return self.lookup_many([text], params, as_json)[0]
+    
+    def record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+    
+    def _evict_oldest(self) -> int:
+        """Free the oldest live row and return it; caller holds the lock"""
+        row, (key, raw_size) = self._live.popitem(last=False)
+        del self._rows[key]
+        self._bytes -= len(self._values[row])
+        self._raw_bytes -= raw_size
+        self._values[row] = None
+        self._groups[row] = -1
+        self.evictions += 1
+        return row
+    
+    def add(self, text: str, params: tuple, value: Any):
+        vector = self.embed(text)
+        numbers = self.numbers_key(text)
+        raw = json_bytes(value)
+        data = self.codec.encode_json(raw)
+        key = (text, params)
+        with self._lock:
+            group = self._group_ids.setdefault(params, len(self._group_ids))
+            row = self._rows.pop(key, None)
+            if row is not None:
+                # Same question again; refresh it in place
+                self._bytes -= len(self._values[row])
+                self._raw_bytes -= self._live.pop(row)[1]
+            elif self._free:
+                row = self._free.pop()
+            elif self._size < self.max_entries:
+                if self._size == len(self._values):
+                    self._grow()
+                row = self._size
+                self._size += 1
+            else:
+                row = self._evict_oldest()
+            self._vectors[row] = vector
+            self._groups[row] = group
+            self._numbers[row] = numbers
+            self._expires[row] = time.monotonic() + self.ttl
+            self._values[row] = data
+            self._live[row] = (key, len(raw))
+            self._rows[key] = row
+            self._bytes += len(data)
+            self._raw_bytes += len(raw)
+            while self._bytes > self.max_bytes and len(self._live) > 1:
+                self._free.append(self._evict_oldest())
+    
+    def clear(self):
+        with self._lock:
+            self._size = 0
+            self._live.clear()
+            self._rows.clear()
+            self._free = []
+            self._bytes = 0
+            self._raw_bytes = 0
+            self._groups[:] = -1
+            self._values = [None] * len(self._values)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'entries': len(self._live),
+                'max_entries': self.max_entries,
+                'dim': self.dim,
+                'threshold': self.threshold,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'compression_ratio': round(self._raw_bytes / self._bytes, 3) if self._bytes else None,
+                'matrix_bytes': int(self._vectors.nbytes)
+            }
+        stats.update(self.codec.stats())
+        return stats
+
+class TrafficRecorder:
+    """Appends every generation request to a JSONL traffic log for later cache warm-up"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.recorded = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8', buffering=1)
+    
+    def record(self, user_input: str, max_length: float, temperature: float, top_p: float, endpoint: str):
+        line = json.dumps({
+            'timestamp': datetime.now().isoformat(),
+            'user_input': user_input,
+            'max_length': max_length,
+            'temperature': temperature,
+            'top_p': top_p,
+            'endpoint': endpoint
+        }, ensure_ascii=False)
+        with self._lock:
+            try:
+                self._file.write(line + '\n')
+                self.recorded += 1
+            except (OSError, ValueError) as e:
+                self.errors += 1
+                logger.warning(f"Failed to record traffic to {self.path}: {e}")
+    
+    def stats(self) -> Dict[str, Any]:
+        return {'path': self.path, 'recorded': self.recorded, 'errors': self.errors}
+
+class CacheWarmer:
+    """
+    Replays the most frequent questions of a JSONL traffic log through the
+    response cache at a bounded concurrency, so a new instance starts with
+    a populated cache. Records need a user_input (or question) field;
+    missing parameters fall back to the defaults, and records with
+    parameters that are not numbers are skipped
+    """
+    
+    def __init__(self, path: str, top: int = 100, concurrency: int = 2, timeout: float = 120.0,
+                 defaults: Optional[Dict[str, Any]] = None, fold_stopwords: bool = False):
+        self.path = path
+        self.top = top
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.defaults = defaults or {}
+        self.fold_stopwords = fold_stopwords
+        self.results = {}
+        self.questions = 0
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+        self._thread = None
+    
+    def load(self) -> List[Dict[str, Any]]:
+        """The `top` most frequent distinct requests in the log, most frequent first"""
+        counts = {}
+        first_seen = {}
+        with open(self.path, encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Skipping malformed line {number} in {self.path}")
+                    continue
+                user_input = record.get('user_input') or record.get('question') if isinstance(record, dict) else None
+                if not isinstance(user_input, str) or not user_input.strip():
+                    continue
+                try:
+                    params = {
+                        'user_input': user_input,
+                        'max_length': float(record.get('max_length', self.defaults.get('max_length'))),
+                        'temperature': float(record.get('temperature', self.defaults.get('temperature'))),
+                        'top_p': float(record.get('top_p', self.defaults.get('top_p'))),
+                        'endpoint': record.get('endpoint', '/generate_response')
+                    }
+                except (TypeError, ValueError):
+                    logger.warning(f"Skipping line {number} in {self.path}: invalid parameters")
+                    continue
+                if not isinstance(params['endpoint'], str):
+                    logger.warning(f"Skipping line {number} in {self.path}: invalid endpoint")
+                    continue
+                key = request_key(fold_stopwords=self.fold_stopwords, **params)
+                counts[key] = counts.get(key, 0) + 1
+                first_seen.setdefault(key, params)
+        ranked = sorted(counts, key=counts.get, reverse=True)[:self.top]
+        return [first_seen[key] for key in ranked]
+    
+    def run(self, generate: Callable[..., tuple]) -> Dict[str, int]:
+        """Send the top requests through generate(); returns a count per cache status"""
+        self.started_at = datetime.now()
+        self.results = {}
         try:
-            logger.info(f"Generating response for input: {user_input[:50]}...")
-            
-            result = self.client.predict(
-                user_input=user_input,
-                max_length=max_length,
-                temperature=temperature,
-                top_p=top_p,
-                api_name=endpoint
-            )
-            
-            logger.info("Response generated successfully")
-            return result
+            requests_to_warm = self.load()
+            self.questions = len(requests_to_warm)
+            logger.info(f"Warming response cache with {self.questions} questions from {self.path}")
             
-        except Exception as e:
-            logger.error(f"Error generating response: {e}")
-            # Try to reconnect once
-            if self._connect():
+            def warm(params):
                 try:
-                    result = self.client.predict(
-                        user_input=user_input,
-                        max_length=max_length,
-                        temperature=temperature,
-                        top_p=top_p,
-                        api_name=endpoint
-                    )
-                    return result
-                except Exception as retry_error:
-                    logger.error(f"Retry failed: {retry_error}")
-                    raise retry_error
-            raise e
-    
-    def get_lambda_data(self) -> tuple:
-        """Get data from the lambda endpoint"""
-        self._ensure_connection()
-        
-        try:
-            logger.info("Fetching lambda data...")
-            result = self.client.predict(api_name="/lambda")
-            logger.info("Lambda data fetched successfully")
-            return result
-        except Exception as e:
-            logger.error(f"Error fetching lambda data: {e}")
-            raise
+                    return generate(deadline=Deadline(self.timeout), record=False, **params)[1]
+                except Exception as e:
+                    logger.warning(f"Cache warm-up request failed: {e}")
+                    return 'failed'
+            
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency,
+                                                       thread_name_prefix='cache-warmup') as pool:
+                for status in pool.map(warm, requests_to_warm):
+                    self.results[status] = self.results.get(status, 0) + 1
+            logger.info(f"Cache warm-up finished: {self.results}")
+        except OSError as e:
+            logger.error(f"Cache warm-up could not read {self.path}: {e}")
+        finally:
+            self.finished_at = datetime.now()
+            self._done.set()
+        return self.results
+    
+    def start(self, generate: Callable[..., tuple]):
+        self._done.clear()
+        self._thread = threading.Thread(target=self.run, args=(generate,), name='cache-warmup', daemon=True)
+        self._thread.start()
+    
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'path': self.path,
+            'done': self.done,
+            'questions': self.questions,
+            'results': dict(self.results),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
 
 # Initialize the client
 API_URL = os.getenv('GRADIO_API_URL', 'https://302463c1bd59d619a7.gradio.live/')
@@ -131,16 +2921,181 @@ DEFAULT_MAX_LENGTH = float(os.getenv('DEFAULT_MAX_LENGTH', '512'))
 DEFAULT_TEMPERATURE = float(os.getenv('DEFAULT_TEMPERATURE', '0.7'))
 DEFAULT_TOP_P = float(os.getenv('DEFAULT_TOP_P', '0.9'))
 API_KEY = os.getenv('API_KEY')  # Optional API key for authentication
+GRADIO_LB_STRATEGY = os.getenv('GRADIO_LB_STRATEGY', 'least_outstanding')
+GRADIO_POOL_SIZE = int(os.getenv('GRADIO_POOL_SIZE', '4'))
+GRADIO_POOL_TIMEOUT = float(os.getenv('GRADIO_POOL_TIMEOUT', '30'))
+GRADIO_POOL_MAX_FAILURES = int(os.getenv('GRADIO_POOL_MAX_FAILURES', '1'))
+GRADIO_SCHEMA_CACHE = os.getenv('GRADIO_SCHEMA_CACHE', 'True').lower() == 'true'
+GRADIO_SCHEMA_CACHE_DIR = os.getenv('GRADIO_SCHEMA_CACHE_DIR', '.gradio_cache')
+GRADIO_SCHEMA_CACHE_TTL = float(os.getenv('GRADIO_SCHEMA_CACHE_TTL', '86400'))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RECOVERY_TIMEOUT = float(os.getenv('CIRCUIT_RECOVERY_TIMEOUT', '30'))
+RETRY_MAX_ATTEMPTS = int(os.getenv('RETRY_MAX_ATTEMPTS', '2'))
+RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', '0.2'))
+RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', '5'))
+RETRY_BUDGET_RATIO = float(os.getenv('RETRY_BUDGET_RATIO', '0.2'))
+RETRY_BUDGET_MIN_PER_SEC = float(os.getenv('RETRY_BUDGET_MIN_PER_SEC', '1'))
+GRADIO_HEDGE_ENABLED = os.getenv('GRADIO_HEDGE_ENABLED', 'False').lower() == 'true'
+GRADIO_HEDGE_PERCENTILE = float(os.getenv('GRADIO_HEDGE_PERCENTILE', '95'))
+GRADIO_HEDGE_MIN_DELAY = float(os.getenv('GRADIO_HEDGE_MIN_DELAY', '0.5'))
+GRADIO_HEDGE_MIN_SAMPLES = int(os.getenv('GRADIO_HEDGE_MIN_SAMPLES', '20'))
+REQUEST_TIMEOUT = float(os.getenv('REQUEST_TIMEOUT', '120'))
+MAX_REQUEST_TIMEOUT = float(os.getenv('MAX_REQUEST_TIMEOUT', '600'))
+GRADIO_KEEPALIVE_INTERVAL = float(os.getenv('GRADIO_KEEPALIVE_INTERVAL', '30'))
+GRADIO_QUEUE_POLL_INTERVAL = float(os.getenv('GRADIO_QUEUE_POLL_INTERVAL', '5'))
+GRADIO_QUEUE_SHEDDING = os.getenv('GRADIO_QUEUE_SHEDDING', 'True').lower() == 'true'
+GRADIO_MODEL_WARMUP = os.getenv('GRADIO_MODEL_WARMUP', 'True').lower() == 'true'
+GRADIO_WARMUP_PROMPTS = [p.strip() for p in os.getenv(
+    'GRADIO_WARMUP_PROMPTS',
+    'Quyền và nghĩa vụ của người lao động là gì?|Thủ tục đăng ký thành lập doanh nghiệp như thế nào?'
+).split('|') if p.strip()]
+GRADIO_WARMUP_ENDPOINTS = [e.strip() for e in os.getenv(
+    'GRADIO_WARMUP_ENDPOINTS', '/generate_response,/generate_response_1'
+).split(',') if e.strip()]
+GRADIO_WARMUP_MAX_LENGTH = float(os.getenv('GRADIO_WARMUP_MAX_LENGTH', '64'))
+SAMPLE_POOL_SIZE = int(os.getenv('SAMPLE_POOL_SIZE', '8'))
+SAMPLE_POOL_REFILL_INTERVAL = float(os.getenv('SAMPLE_POOL_REFILL_INTERVAL', '2'))
+GRADIO_LAZY_INIT = os.getenv('GRADIO_LAZY_INIT', 'True').lower() == 'true'
+GRADIO_WARMUP_ON_START = os.getenv('GRADIO_WARMUP_ON_START', 'True').lower() == 'true'
+JOB_TTL = float(os.getenv('JOB_TTL', '600'))
+JOB_MAX = int(os.getenv('JOB_MAX', '1000'))
+CACHE_ENABLED = os.getenv('CACHE_ENABLED', 'True').lower() == 'true'
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '1024'))
+CACHE_TTL = float(os.getenv('CACHE_TTL', '3600'))
+CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+CACHE_COMPRESSION = os.getenv('CACHE_COMPRESSION', 'zlib').lower()
+CACHE_COMPRESSION_LEVEL = int(os.getenv('CACHE_COMPRESSION_LEVEL', '6'))
+CACHE_COMPRESSION_MIN_SIZE = int(os.getenv('CACHE_COMPRESSION_MIN_SIZE', '256'))
+CACHE_COMPRESSION_DICT = os.getenv('CACHE_COMPRESSION_DICT', '')
+CACHE_EVICTION_POLICY = os.getenv('CACHE_EVICTION_POLICY', 'tinylfu').lower()
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory')
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_REDIS_PREFIX = os.getenv('CACHE_REDIS_PREFIX', 'legalqa:')
+CACHE_REDIS_TIMEOUT = float(os.getenv('CACHE_REDIS_TIMEOUT', '1.0'))
+CACHE_PERSIST = os.getenv('CACHE_PERSIST', 'True').lower() == 'true'
+CACHE_PERSIST_PATH = os.getenv('CACHE_PERSIST_PATH', os.path.join(GRADIO_SCHEMA_CACHE_DIR, 'answers.sqlite3'))
+CACHE_PERSIST_MAX_BYTES = int(os.getenv('CACHE_PERSIST_MAX_BYTES', str(256 * 1024 * 1024)))
+CACHE_STALE_WHILE_REVALIDATE = float(os.getenv('CACHE_STALE_WHILE_REVALIDATE', '0'))
+CACHE_STALE_IF_ERROR = float(os.getenv('CACHE_STALE_IF_ERROR', '86400'))
+CACHE_FOLD_STOPWORDS = os.getenv('CACHE_FOLD_STOPWORDS', 'False').lower() == 'true'
+CACHE_WARMUP_FILE = os.getenv('CACHE_WARMUP_FILE', '')
+CACHE_WARMUP_TOP = int(os.getenv('CACHE_WARMUP_TOP', '100'))
+CACHE_WARMUP_CONCURRENCY = int(os.getenv('CACHE_WARMUP_CONCURRENCY', '2'))
+TRAFFIC_LOG_PATH = os.getenv('TRAFFIC_LOG_PATH', '')
+REQUEST_COALESCING = os.getenv('REQUEST_COALESCING', 'True').lower() == 'true'
+SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'False').lower() == 'true'
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.9'))
+SEMANTIC_CACHE_DIM = int(os.getenv('SEMANTIC_CACHE_DIM', '256'))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '10000'))
+SEMANTIC_CACHE_MAX_BYTES = int(os.getenv('SEMANTIC_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
 
 logger.info(f"Initializing with API URL: {API_URL}")
 
 try:
-    gradio_client = GradioAPIClient(API_URL)
+    schema_cache = SchemaCache(GRADIO_SCHEMA_CACHE_DIR, ttl=GRADIO_SCHEMA_CACHE_TTL) if GRADIO_SCHEMA_CACHE else None
+    gradio_client = GradioAPIClient(API_URL,
+                                    pool_size=GRADIO_POOL_SIZE,
+                                    pool_timeout=GRADIO_POOL_TIMEOUT,
+                                    pool_max_failures=GRADIO_POOL_MAX_FAILURES,
+                                    lazy=GRADIO_LAZY_INIT,
+                                    schema_cache=schema_cache,
+                                    breaker_factory=lambda url: CircuitBreaker(url,
+                                                                               failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+                                                                               recovery_timeout=CIRCUIT_RECOVERY_TIMEOUT),
+                                    retry_policy=RetryPolicy(max_attempts=RETRY_MAX_ATTEMPTS,
+                                                             base_delay=RETRY_BASE_DELAY,
+                                                             max_delay=RETRY_MAX_DELAY,
+                                                             budget=RetryBudget(ratio=RETRY_BUDGET_RATIO,
+                                                                                min_per_second=RETRY_BUDGET_MIN_PER_SEC)),
+                                    strategy=GRADIO_LB_STRATEGY,
+                                    hedging=HedgingPolicy(enabled=GRADIO_HEDGE_ENABLED,
+                                                          percentile=GRADIO_HEDGE_PERCENTILE,
+                                                          min_delay=GRADIO_HEDGE_MIN_DELAY,
+                                                          min_samples=GRADIO_HEDGE_MIN_SAMPLES),
+                                    queue_shedding=GRADIO_QUEUE_SHEDDING,
+                                    warmer=ModelWarmer(GRADIO_WARMUP_PROMPTS, GRADIO_WARMUP_ENDPOINTS,
+                                                       max_length=GRADIO_WARMUP_MAX_LENGTH)
+                                    if GRADIO_MODEL_WARMUP and GRADIO_WARMUP_PROMPTS else None)
+    if GRADIO_WARMUP_ON_START:
+        gradio_client.start_warmup()
     logger.info("Gradio client initialized successfully!")
 except Exception as e:
     logger.error(f"Failed to initialize Gradio client: {e}")
     gradio_client = None
 
+connection_supervisor = None
+if gradio_client and GRADIO_KEEPALIVE_INTERVAL > 0:
+    connection_supervisor = ConnectionSupervisor(gradio_client, interval=GRADIO_KEEPALIVE_INTERVAL)
+    connection_supervisor.start()
+
+queue_monitor = None
+if gradio_client and GRADIO_QUEUE_POLL_INTERVAL > 0:
+    queue_monitor = QueueMonitor(gradio_client, interval=GRADIO_QUEUE_POLL_INTERVAL)
+    queue_monitor.start()
+
+sample_pool = None
+if gradio_client and SAMPLE_POOL_SIZE > 0:
+    sample_pool = SamplePool(gradio_client, size=SAMPLE_POOL_SIZE, refill_interval=SAMPLE_POOL_REFILL_INTERVAL)
+    sample_pool.start()
+
+job_registry = JobRegistry(ttl=JOB_TTL, max_jobs=JOB_MAX)
+
+def create_answer_codec() -> AnswerCodec:
+    """A codec per answer cache, so each reports its own compression ratio"""
+    dictionary = LEGAL_COMPRESSION_DICT
+    if CACHE_COMPRESSION_DICT:
+        with open(CACHE_COMPRESSION_DICT, 'rb') as f:
+            dictionary = f.read()
+    return AnswerCodec(CACHE_COMPRESSION, level=CACHE_COMPRESSION_LEVEL,
+                       min_size=CACHE_COMPRESSION_MIN_SIZE, dictionary=dictionary)
+
+response_cache = None
+if CACHE_ENABLED:
+    try:
+        cache_backend = create_cache_backend(CACHE_BACKEND,
+                                             max_entries=CACHE_MAX_ENTRIES,
+                                             memory_max_bytes=CACHE_MAX_BYTES,
+                                             policy=CACHE_EVICTION_POLICY,
+                                             url=CACHE_REDIS_URL,
+                                             prefix=CACHE_REDIS_PREFIX,
+                                             timeout=CACHE_REDIS_TIMEOUT,
+                                             path=CACHE_PERSIST_PATH,
+                                             max_bytes=CACHE_PERSIST_MAX_BYTES)
+        if CACHE_PERSIST and cache_backend.name != 'sqlite':
+            cache_backend = TieredCacheBackend(cache_backend,
+                                               create_cache_backend('sqlite', path=CACHE_PERSIST_PATH,
+                                                                    max_bytes=CACHE_PERSIST_MAX_BYTES))
+        response_cache = ResponseCache(cache_backend, ttl=CACHE_TTL, fold_stopwords=CACHE_FOLD_STOPWORDS,
+                                       stale_while_revalidate=CACHE_STALE_WHILE_REVALIDATE,
+                                       stale_if_error=CACHE_STALE_IF_ERROR,
+                                       codec=create_answer_codec())
+        logger.info(f"Response cache enabled ({cache_backend.name} backend)")
+    except (ValueError, sqlite3.Error, OSError) as e:
+        logger.error(f"Failed to initialize response cache: {e}")
+
+traffic_recorder = None
+if TRAFFIC_LOG_PATH:
+    try:
+        traffic_recorder = TrafficRecorder(TRAFFIC_LOG_PATH)
+        logger.info(f"Recording generation traffic to {TRAFFIC_LOG_PATH}")
+    except OSError as e:
+        logger.error(f"Failed to open traffic log {TRAFFIC_LOG_PATH}: {e}")
+
+# Identical questions in flight at the same time share one upstream call
+request_flight = SingleFlight(detached=True) if REQUEST_COALESCING else None
+
+semantic_cache = None
+if response_cache and SEMANTIC_CACHE_ENABLED:
+    if np is None:
+        logger.warning("numpy is not installed; semantic cache disabled")
+    else:
+        semantic_cache = SemanticCache(threshold=SEMANTIC_CACHE_THRESHOLD,
+                                       dim=SEMANTIC_CACHE_DIM,
+                                       max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+                                       max_bytes=SEMANTIC_CACHE_MAX_BYTES,
+                                       ttl=CACHE_TTL,
+                                       codec=create_answer_codec())
+
 # Authentication decorator
 def require_api_key(f):
     @wraps(f)
@@ -161,6 +3116,39 @@ def handle_errors(f):
     def decorated_function(*args, **kwargs):
         try:
             return f(*args, **kwargs)
+        except CircuitOpenError as e:
+            logger.warning(f"Circuit open: {e}")
+            response = jsonify({
+                'error': 'The AI service is temporarily unavailable',
+                'status': 'circuit_open',
+                'message': str(e),
+                'retry_after': round(e.retry_after, 2)
+            })
+            response.headers['Retry-After'] = str(int(e.retry_after) + 1)
+            return response, 503
+        except InvalidEndpointError as e:
+            logger.warning(f"Invalid endpoint: {e}")
+            return jsonify({
+                'error': str(e),
+                'status': 'bad_request'
+            }), 400
+        except DeadlineExceededError as e:
+            logger.warning(f"Deadline exceeded: {e}")
+            return jsonify({
+                'error': 'The AI service did not answer in time',
+                'status': 'deadline_exceeded',
+                'message': str(e)
+            }), 504
+        except UpstreamOverloadedError as e:
+            logger.warning(f"Shedding request: {e}")
+            response = jsonify({
+                'error': 'The AI service is too busy to answer before the deadline',
+                'status': 'overloaded',
+                'message': str(e),
+                'retry_after': round(e.retry_after, 2)
+            })
+            response.headers['Retry-After'] = str(int(e.retry_after) + 1)
+            return response, 503
         except ConnectionError as e:
             logger.error(f"Connection error: {e}")
             return jsonify({
@@ -178,6 +3166,202 @@ def handle_errors(f):
             }), 500
     return decorated_function
 
+def request_deadline() -> Deadline:
+    """Deadline for the current request, from X-Request-Timeout or REQUEST_TIMEOUT"""
+    timeout = REQUEST_TIMEOUT
+    header = request.headers.get('X-Request-Timeout')
+    if header:
+        try:
+            requested = float(header)
+            if requested > 0:
+                timeout = min(requested, MAX_REQUEST_TIMEOUT)
+        except ValueError:
+            logger.warning(f"Ignoring invalid X-Request-Timeout header: {header}")
+    return Deadline(timeout)
+
+def cache_bypassed(data: Optional[Dict[str, Any]] = None) -> bool:
+    """Whether the caller asked to skip cached answers (Cache-Control: no-cache or cache=false)"""
+    if 'no-cache' in request.headers.get('Cache-Control', '').lower():
+        return True
+    flag = (data or {}).get('cache', request.args.get('cache'))
+    return str(flag).lower() in ('false', '0', 'no', 'off')
+
+def parse_flag(value: Any) -> Optional[bool]:
+    """A boolean request field, also given as "true"/"false", 1/0, "yes"/"no" or "on"/"off"; None if absent"""
+    if value is None or isinstance(value, bool):
+        return value
+    flag = str(value).lower()
+    if flag in ('true', '1', 'yes', 'on'):
+        return True
+    if flag in ('false', '0', 'no', 'off'):
+        return False
+    raise ValueError(f"Invalid boolean value: {value!r}")
+
+def semantic_params(max_length: float, temperature: float, top_p: float,
+                    endpoint: str = "/generate_response") -> tuple:
+    """Generation parameters a semantic match must share"""
+    return (float(max_length), float(temperature), float(top_p), endpoint)
+
+class JSONTemplate:
+    """
+    A JSON object body serialized once up front. render() splices in only
+    the fields marked SLOT, given as values or as JSON bytes already encoded
+    """
+    
+    SLOT = object()
+    
+    def __init__(self, **fields):
+        self._parts = []  # Constant bytes before each slot
+        self._slots = []
+        chunk = b'{'
+        for i, (name, value) in enumerate(fields.items()):
+            chunk += (b', ' if i else b'') + json_bytes(name) + b': '
+            if value is self.SLOT:
+                self._parts.append(chunk)
+                self._slots.append(name)
+                chunk = b''
+            else:
+                chunk += json_bytes(value)
+        self._tail = chunk + b'}'
+    
+    def render(self, **values) -> bytes:
+        out = []
+        for part, name in zip(self._parts, self._slots):
+            value = values[name]
+            out.append(part)
+            out.append(value if isinstance(value, bytes) else json_bytes(value))
+        out.append(self._tail)
+        return b''.join(out)
+    
+    def response(self, **values) -> Response:
+        return Response(self.render(**values), mimetype='application/json')
+
+GENERATE_TEMPLATE = JSONTemplate(status='success', user_input=JSONTemplate.SLOT,
+                                 response=JSONTemplate.SLOT, parameters=JSONTemplate.SLOT,
+                                 cache=JSONTemplate.SLOT, timestamp=JSONTemplate.SLOT)
+ASK_TEMPLATE = JSONTemplate(status='success', question=JSONTemplate.SLOT, response=JSONTemplate.SLOT,
+                            cache=JSONTemplate.SLOT, timestamp=JSONTemplate.SLOT)
+
+def cached_generate(user_input: str, max_length: float, temperature: float, top_p: float,
+                    endpoint: str = "/generate_response", bypass: bool = False,
+                    semantic_match: Optional[tuple] = None, record: bool = True,
+                    as_json: bool = False, **kwargs) -> tuple:
+    """
+    Answer from the response cache, then the semantic cache, when possible;
+    otherwise join an identical in-flight request or call the upstream.
+    Expired answers may be served while a background refresh runs, or when
+    the upstream call fails. Returns (response, cache_status), with the
+    response as JSON bytes when as_json is set, so cached answers are never
+    decoded. semantic_match may carry a lookup already done in bulk by the caller
+    """
+    def result(response, status: str) -> tuple:
+        return (json_bytes(response) if as_json else response), status
+    
+    def cached_result(data: bytes, status: str) -> tuple:
+        return (data if as_json else json.loads(data)), status
+    
+    params = dict(user_input=user_input, max_length=max_length, temperature=temperature,
+                  top_p=top_p, endpoint=endpoint)
+    if record and traffic_recorder is not None:
+        traffic_recorder.record(**params)
+    
+    key = response_cache.make_key(**params) if response_cache is not None else request_key(**params)
+    
+    def generate(**call_kwargs):
+        response = gradio_client.generate_response(**params, **call_kwargs)
+        if response and response_cache is not None:
+            response_cache.set(key, response)
+            if semantic_cache is not None:
+                semantic_cache.add(response_cache.normalize(user_input),
+                                   semantic_params(max_length, temperature, top_p, endpoint), response)
+        return response
+    
+    def fetch(**call_kwargs) -> tuple:
+        """
+        (response, shared) from the upstream, coalesced with identical
+        in-flight calls. The shared call runs to MAX_REQUEST_TIMEOUT; each
+        caller only waits for it until its own deadline
+        """
+        if request_flight is None:
+            return generate(**call_kwargs), False
+        shared_kwargs = dict(call_kwargs, deadline=Deadline(MAX_REQUEST_TIMEOUT))
+        return request_flight.do((key, call_kwargs.get('hedge')), lambda: generate(**shared_kwargs),
+                                 deadline=call_kwargs.get('deadline'))
+    
+    if response_cache is None:
+        response, shared = fetch(**kwargs)
+        return result(response, 'coalesced' if shared else 'disabled')
+    
+    fallback = None
+    if bypass:
+        response_cache.record('bypass')
+    else:
+        cached = response_cache.get_json(key)
+        if cached is not None:
+            data, age = cached
+            if response_cache.is_fresh(age):
+                response_cache.record('hit')
+                return cached_result(data, 'hit')
+            if response_cache.can_revalidate(age):
+                response_cache.record('stale')
+                response_cache.refresh(key, lambda: fetch(deadline=Deadline(REQUEST_TIMEOUT)))
+                return cached_result(data, 'stale')
+            if response_cache.can_serve_on_error(age):
+                fallback = data
+        if semantic_cache is not None:
+            if semantic_match is None:
+                semantic_match = semantic_cache.lookup(response_cache.normalize(user_input),
+                                                       semantic_params(max_length, temperature, top_p, endpoint),
+                                                       as_json=as_json)
+            elif as_json and semantic_match[0] is not None:
+                semantic_match = (json_bytes(semantic_match[0]), semantic_match[1])
+            semantic_cache.record(semantic_match[0] is not None)
+            if semantic_match[0] is not None:
+                return semantic_match[0], 'semantic'
+    
+    try:
+        response, shared = fetch(**kwargs)
+    except Exception as e:
+        if fallback is None:
+            if not bypass:
+                response_cache.record('miss')
+            raise
+        logger.warning(f"Serving stale cached answer after upstream failure: {e}")
+        response_cache.record('stale_error')
+        return cached_result(fallback, 'stale_error')
+    
+    if bypass:
+        return result(response, 'coalesced' if shared else 'bypass')
+    response_cache.record('miss')
+    return result(response, 'coalesced' if shared else 'miss')
+
+def create_cache_warmer(path: str, top: int, concurrency: int) -> CacheWarmer:
+    return CacheWarmer(path, top=top, concurrency=concurrency, timeout=MAX_REQUEST_TIMEOUT,
+                       defaults={'max_length': DEFAULT_MAX_LENGTH,
+                                 'temperature': DEFAULT_TEMPERATURE,
+                                 'top_p': DEFAULT_TOP_P},
+                       fold_stopwords=CACHE_FOLD_STOPWORDS)
+
+# Warm the response cache from recorded traffic before reporting ready
+cache_warmer = None
+if gradio_client and response_cache and CACHE_WARMUP_FILE:
+    cache_warmer = create_cache_warmer(CACHE_WARMUP_FILE, CACHE_WARMUP_TOP, CACHE_WARMUP_CONCURRENCY)
+    cache_warmer.start(cached_generate)
+
+@app.cli.command('warm-cache')
+@click.argument('path')
+@click.option('--top', default=CACHE_WARMUP_TOP, show_default=True, help='Number of most frequent questions to replay')
+@click.option('--concurrency', default=CACHE_WARMUP_CONCURRENCY, show_default=True, help='Concurrent upstream calls')
+def warm_cache_command(path, top, concurrency):
+    """Pre-populate the response cache from a JSONL traffic log"""
+    if not gradio_client or not response_cache:
+        raise click.ClickException('Gradio client or response cache not initialized')
+    if response_cache.backend.name == 'memory':
+        click.echo('Warning: the memory cache backend does not outlive this command; '
+                   'enable CACHE_PERSIST or use the redis backend', err=True)
+    results = create_cache_warmer(path, top, concurrency).run(cached_generate)
+    click.echo(json.dumps(results))
+
 # Health check endpoint
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -186,16 +3370,22 @@ def health_check():
         if gradio_client and gradio_client.client:
             # Try a simple connection test
             try:
-                # Test if we can still connect
-                test_client = Client(gradio_client.api_url)
+                # Test if we can still reach the upstream config
+                reachable = gradio_client.probe()
                 status = 'healthy'
                 code = 200
                 message = 'API connection successful'
+                if not all(reachable.values()):
+                    message = f'{sum(reachable.values())}/{len(reachable)} upstreams reachable'
             except Exception as e:
                 logger.warning(f"Health check failed: {e}")
                 status = 'unhealthy'
                 code = 503
                 message = f'API connection failed: {str(e)}'
+        elif gradio_client:
+            status = 'unhealthy'
+            code = 503
+            message = 'Gradio client warming up' if gradio_client.warming_up else 'Gradio client not connected'
         else:
             status = 'unhealthy'
             code = 503
@@ -211,9 +3401,35 @@ def health_check():
         'message': message,
         'api_url': API_URL,
         'last_connected': gradio_client.last_connected.isoformat() if gradio_client and gradio_client.last_connected else None,
+        'load_balancing': gradio_client.strategy if gradio_client else None,
+        'upstreams': gradio_client.stats() if gradio_client else None,
+        'retries': gradio_client.retry_policy.stats() if gradio_client else None,
+        'hedging': gradio_client.hedging.stats() if gradio_client else None,
+        'supervisor': connection_supervisor.stats() if connection_supervisor else None,
+        'queue_monitor': queue_monitor.stats() if queue_monitor else None,
+        'sample_pool': sample_pool.stats() if sample_pool else None,
+        'cache_warmup': cache_warmer.stats() if cache_warmer else None,
+        'traffic_log': traffic_recorder.stats() if traffic_recorder else None,
+        'active_jobs': job_registry.active_count(),
+        'response_cache': response_cache.stats() if response_cache else None,
+        'semantic_cache': semantic_cache.stats() if semantic_cache else None,
+        'request_coalescing': request_flight.stats() if request_flight else None,
         'timestamp': datetime.now().isoformat()
     }), code
 
+# Readiness endpoint
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness check: reports whether an upstream connection is established and warm"""
+    ready = bool(gradio_client and gradio_client.ready and (cache_warmer is None or cache_warmer.done))
+    return jsonify({
+        'status': 'ready' if ready else 'not_ready',
+        'warming_up': bool(gradio_client and gradio_client.warming_up),
+        'model_warmup': gradio_client.warmer.stats() if gradio_client and gradio_client.warmer else None,
+        'cache_warmup': cache_warmer.stats() if cache_warmer else None,
+        'timestamp': datetime.now().isoformat()
+    }), 200 if ready else 503
+
 # Main generation endpoint
 @app.route('/generate', methods=['POST'])
 @require_api_key
@@ -246,6 +3462,13 @@ def generate_response():
     temperature = data.get('temperature', DEFAULT_TEMPERATURE)
     top_p = data.get('top_p', DEFAULT_TOP_P)
     endpoint = data.get('endpoint', '/generate_response')
+    try:
+        hedge = parse_flag(data.get('hedge'))  # None falls back to GRADIO_HEDGE_ENABLED
+    except ValueError:
+        return jsonify({
+            'error': 'hedge must be a boolean',
+            'status': 'bad_request'
+        }), 400
     
     # Validate parameters
     if not (1 <= max_length <= 2048):
@@ -256,18 +3479,83 @@ def generate_response():
         top_p = DEFAULT_TOP_P
     
     # Generate response
-    response = gradio_client.generate_response(
+    response, cache_status = cached_generate(
+        user_input=user_input,
+        max_length=max_length,
+        temperature=temperature,
+        top_p=top_p,
+        endpoint=endpoint,
+        bypass=cache_bypassed(data),
+        hedge=hedge,
+        deadline=request_deadline(),
+        as_json=True
+    )
+    
+    return GENERATE_TEMPLATE.response(
+        user_input=user_input,
+        response=response,
+        parameters={
+            'max_length': max_length,
+            'temperature': temperature,
+            'top_p': top_p,
+            'endpoint': endpoint
+        },
+        cache=cache_status,
+        timestamp=datetime.now().isoformat()
+    )
+
+# Asynchronous generation endpoint
+@app.route('/generate/async', methods=['POST'])
+@require_api_key
+@handle_errors
+def submit_generation():
+    """Submit a generation job and return immediately with its id"""
+    if not gradio_client:
+        return jsonify({
+            'error': 'Gradio client not initialized',
+            'status': 'service_unavailable'
+        }), 503
+    
+    data = request.get_json()
+    if not data:
+        return jsonify({
+            'error': 'No JSON data provided',
+            'status': 'bad_request'
+        }), 400
+    
+    user_input = data.get('user_input') or data.get('question')
+    if not user_input:
+        return jsonify({
+            'error': 'user_input or question is required',
+            'status': 'bad_request'
+        }), 400
+    
+    max_length = data.get('max_length', DEFAULT_MAX_LENGTH)
+    temperature = data.get('temperature', DEFAULT_TEMPERATURE)
+    top_p = data.get('top_p', DEFAULT_TOP_P)
+    endpoint = data.get('endpoint', '/generate_response')
+    
+    if not (1 <= max_length <= 2048):
+        max_length = DEFAULT_MAX_LENGTH
+    if not (0.0 <= temperature <= 2.0):
+        temperature = DEFAULT_TEMPERATURE
+    if not (0.0 <= top_p <= 1.0):
+        top_p = DEFAULT_TOP_P
+    
+    job = gradio_client.submit_response(
         user_input=user_input,
         max_length=max_length,
         temperature=temperature,
         top_p=top_p,
         endpoint=endpoint
     )
+    job_id = job_registry.add(job, {'user_input': user_input, 'endpoint': endpoint})
     
     return jsonify({
-        'status': 'success',
+        'status': 'submitted',
+        'job_id': job_id,
+        'status_url': f'/jobs/{job_id}',
         'user_input': user_input,
-        'response': response,
         'parameters': {
             'max_length': max_length,
             'temperature': temperature,
@@ -275,6 +3563,32 @@ def generate_response():
             'endpoint': endpoint
         },
         'timestamp': datetime.now().isoformat()
+    }), 202
+
+# Job status endpoint
+@app.route('/jobs/<job_id>', methods=['GET', 'DELETE'])
+@require_api_key
+@handle_errors
+def job_status(job_id):
+    """Poll or cancel a submitted generation job"""
+    entry = job_registry.get(job_id)
+    if not entry:
+        return jsonify({
+            'error': 'Job not found or expired',
+            'status': 'not_found'
+        }), 404
+    
+    if request.method == 'DELETE':
+        entry['job'].cancel()
+        job_registry.remove(job_id)
+    
+    return jsonify({
+        'status': 'success',
+        'job_id': job_id,
+        'job': describe_job(entry['job']),
+        'user_input': entry['meta'].get('user_input'),
+        'endpoint': entry['meta'].get('endpoint'),
+        'timestamp': datetime.now().isoformat()
     })
 
 # Alternative endpoint for GET requests
@@ -301,19 +3615,22 @@ def ask_question():
     temperature = float(request.args.get('temperature', DEFAULT_TEMPERATURE))
     top_p = float(request.args.get('top_p', DEFAULT_TOP_P))
     
-    response = gradio_client.generate_response(
+    response, cache_status = cached_generate(
         user_input=question,
         max_length=max_length,
         temperature=temperature,
-        top_p=top_p
+        top_p=top_p,
+        bypass=cache_bypassed(),
+        deadline=request_deadline(),
+        as_json=True
     )
     
-    return jsonify({
-        'status': 'success',
-        'question': question,
-        'response': response,
-        'timestamp': datetime.now().isoformat()
-    })
+    return ASK_TEMPLATE.response(
+        question=question,
+        response=response,
+        cache=cache_status,
+        timestamp=datetime.now().isoformat()
+    )
 
 # Compare endpoints
 @app.route('/compare', methods=['POST'])
@@ -344,6 +3661,7 @@ def compare_endpoints():
     max_length = data.get('max_length', DEFAULT_MAX_LENGTH)
     temperature = data.get('temperature', DEFAULT_TEMPERATURE)
     top_p = data.get('top_p', DEFAULT_TOP_P)
+    deadline = request_deadline()
     
     # Generate responses from both endpoints
     response1 = gradio_client.generate_response(
@@ -351,7 +3669,8 @@ def compare_endpoints():
         max_length=max_length,
         temperature=temperature,
         top_p=top_p,
-        endpoint="/generate_response"
+        endpoint="/generate_response",
+        deadline=deadline
     )
     
     time.sleep(0.5)  # Small delay between requests
@@ -361,7 +3680,8 @@ def compare_endpoints():
         max_length=max_length,
         temperature=temperature,
         top_p=top_p,
-        endpoint="/generate_response_1"
+        endpoint="/generate_response_1",
+        deadline=deadline
     )
     
     return jsonify({
@@ -391,7 +3711,10 @@ def get_sample_data():
             'status': 'service_unavailable'
         }), 503
     
-    question, response = gradio_client.get_lambda_data()
+    sample = sample_pool.take() if sample_pool else None
+    if sample is None:
+        sample = gradio_client.get_lambda_data(deadline=request_deadline())
+    question, response = sample
     
     return jsonify({
         'status': 'success',
@@ -436,26 +3759,39 @@ def batch_generate():
     temperature = data.get('temperature', DEFAULT_TEMPERATURE)
     top_p = data.get('top_p', DEFAULT_TOP_P)
     delay = data.get('delay', 1.0)  # Delay between requests
+    deadline = request_deadline()  # Shared by the whole batch
+    bypass = cache_bypassed(data)
+    
+    # One matrix product finds semantic matches for the whole batch
+    semantic_matches = [None] * len(questions)
+    if semantic_cache is not None and not bypass:
+        semantic_matches = semantic_cache.lookup_many(
+            [response_cache.normalize(q) if isinstance(q, str) else '' for q in questions],
+            semantic_params(max_length, temperature, top_p))
     
     results = []
     for i, question in enumerate(questions):
         try:
-            response = gradio_client.generate_response(
+            response, cache_status = cached_generate(
                 user_input=question,
                 max_length=max_length,
                 temperature=temperature,
-                top_p=top_p
+                top_p=top_p,
+                bypass=bypass,
+                semantic_match=semantic_matches[i],
+                deadline=deadline
             )
             
             results.append({
                 'index': i,
                 'question': question,
                 'response': response,
+                'cache': cache_status,
                 'status': 'success'
             })
             
-            # Rate limiting
-            if i < len(questions) - 1:
+            # Rate limiting (answers served from the cache never reached the upstream)
+            if i < len(questions) - 1 and cache_status not in ('hit', 'stale', 'semantic'):
                 time.sleep(delay)
                 
         except Exception as e:
@@ -505,7 +3841,11 @@ def api_documentation():
             'GET /': 'Web interface',
             'GET /docs': 'This documentation',
             'GET /health': 'Health check',
+            'GET /ready': 'Readiness check (upstream connection established)',
             'POST /generate': 'Generate response (main endpoint)',
+            'POST /generate/async': 'Submit a generation job and return its id',
+            'GET /jobs/<job_id>': 'Poll job status, queue position and result',
+            'DELETE /jobs/<job_id>': 'Cancel a submitted job',
             'GET /ask': 'Ask question via GET request',
             'POST /compare': 'Compare responses from both endpoints',
             'GET /sample': 'Get sample data from lambda endpoint',
@@ -536,11 +3876,73 @@ def api_documentation():
             }
         },
         'environment_variables': {
-            'GRADIO_API_URL': 'Gradio API URL (required)',
+            'GRADIO_API_URL': 'Gradio API URL, or a comma-separated list of replicas (required)',
+            'GRADIO_LB_STRATEGY': 'Balancing across replicas: least_outstanding, ewma or shortest_queue (default: least_outstanding)',
             'API_KEY': 'API key for authentication (optional)',
             'DEFAULT_MAX_LENGTH': 'Default max response length (default: 512)',
             'DEFAULT_TEMPERATURE': 'Default temperature (default: 0.7)',
-            'DEFAULT_TOP_P': 'Default top_p (default: 0.9)'
+            'DEFAULT_TOP_P': 'Default top_p (default: 0.9)',
+            'GRADIO_POOL_SIZE': 'Number of pooled Gradio clients (default: 4)',
+            'GRADIO_POOL_TIMEOUT': 'Seconds to wait for a free pooled client (default: 30)',
+            'GRADIO_POOL_MAX_FAILURES': 'Consecutive failures before a pooled client is replaced (default: 1)',
+            'GRADIO_SCHEMA_CACHE': 'Cache the upstream config and API info on disk (default: True)',
+            'GRADIO_SCHEMA_CACHE_DIR': 'Directory for the schema cache (default: .gradio_cache)',
+            'GRADIO_SCHEMA_CACHE_TTL': 'Seconds a cached schema stays valid (default: 86400)',
+            'CIRCUIT_FAILURE_THRESHOLD': 'Consecutive upstream failures that open the circuit (default: 5)',
+            'CIRCUIT_RECOVERY_TIMEOUT': 'Seconds the circuit stays open before a probe request (default: 30)',
+            'RETRY_MAX_ATTEMPTS': 'Maximum attempts per upstream call, including the first (default: 2)',
+            'RETRY_BASE_DELAY': 'Base exponential backoff delay in seconds (default: 0.2)',
+            'RETRY_MAX_DELAY': 'Maximum backoff delay in seconds (default: 5)',
+            'RETRY_BUDGET_RATIO': 'Retries allowed per request as a fraction of traffic (default: 0.2)',
+            'RETRY_BUDGET_MIN_PER_SEC': 'Retries always allowed per second regardless of traffic (default: 1)',
+            'GRADIO_HEDGE_ENABLED': 'Hedge slow /generate calls by default (default: False)',
+            'GRADIO_HEDGE_PERCENTILE': 'Latency percentile after which a hedge is sent (default: 95)',
+            'GRADIO_HEDGE_MIN_DELAY': 'Minimum seconds before hedging (default: 0.5)',
+            'GRADIO_HEDGE_MIN_SAMPLES': 'Latency samples needed before hedging starts (default: 20)',
+            'REQUEST_TIMEOUT': 'Default end-to-end deadline for upstream calls in seconds (default: 120)',
+            'MAX_REQUEST_TIMEOUT': 'Upper bound for the X-Request-Timeout header in seconds (default: 600)',
+            'GRADIO_KEEPALIVE_INTERVAL': 'Seconds between background upstream pings and reconnects, 0 disables (default: 30)',
+            'GRADIO_QUEUE_POLL_INTERVAL': 'Seconds between upstream queue status polls, 0 disables (default: 5)',
+            'GRADIO_QUEUE_SHEDDING': 'Reject calls whose queue ETA exceeds the request deadline (default: True)',
+            'GRADIO_MODEL_WARMUP': 'Send warm-up prompts before reporting ready and after reconnects (default: True)',
+            'GRADIO_WARMUP_PROMPTS': 'Warm-up prompts separated by | (default: two Vietnamese legal questions)',
+            'GRADIO_WARMUP_ENDPOINTS': 'Comma-separated endpoints to warm (default: /generate_response,/generate_response_1)',
+            'GRADIO_WARMUP_MAX_LENGTH': 'max_length used for warm-up prompts (default: 64)',
+            'SAMPLE_POOL_SIZE': 'Number of /sample results prefetched in the background, 0 disables (default: 8)',
+            'SAMPLE_POOL_REFILL_INTERVAL': 'Minimum seconds between background /sample fetches (default: 2)',
+            'GRADIO_LAZY_INIT': 'Defer the upstream connection until first use (default: True)',
+            'GRADIO_WARMUP_ON_START': 'Connect (and warm the model) in a background thread at startup (default: True)',
+            'JOB_TTL': 'Seconds a submitted job stays pollable (default: 600)',
+            'JOB_MAX': 'Maximum number of tracked jobs (default: 1000)',
+            'CACHE_ENABLED': 'Cache answers for /generate, /ask and /batch (default: True)',
+            'CACHE_MAX_ENTRIES': 'Maximum number of cached answers in the memory backend (default: 1024)',
+            'CACHE_TTL': 'Seconds a cached answer stays valid (default: 3600)',
+            'CACHE_MAX_BYTES': 'Byte budget for the in-memory answer cache (default: 67108864)',
+            'CACHE_COMPRESSION': 'Compression for cached answers: none, zlib or zstd (needs zstandard) (default: zlib)',
+            'CACHE_COMPRESSION_LEVEL': 'Compression level (default: 6)',
+            'CACHE_COMPRESSION_MIN_SIZE': 'Answers smaller than this many bytes are stored uncompressed (default: 256)',
+            'CACHE_COMPRESSION_DICT': 'File with a raw compression dictionary (default: built-in Vietnamese legal phrases)',
+            'CACHE_EVICTION_POLICY': 'Memory cache eviction: lru, or tinylfu to keep popular answers through scans (default: tinylfu)',
+            'CACHE_BACKEND': 'Answer cache storage: memory (per process), redis (shared) or sqlite (default: memory)',
+            'CACHE_REDIS_URL': 'Redis URL for the redis backend (default: redis://localhost:6379/0)',
+            'CACHE_REDIS_PREFIX': 'Key prefix for cached answers in Redis (default: legalqa:)',
+            'CACHE_REDIS_TIMEOUT': 'Socket timeout for Redis calls in seconds (default: 1.0)',
+            'CACHE_PERSIST': 'Keep cached answers in a SQLite file that survives restarts (default: True)',
+            'CACHE_PERSIST_PATH': 'SQLite file for persisted answers (default: .gradio_cache/answers.sqlite3)',
+            'CACHE_PERSIST_MAX_BYTES': 'Size budget for persisted answers before compaction (default: 268435456)',
+            'CACHE_STALE_WHILE_REVALIDATE': 'Seconds past the TTL an answer is served while it is refreshed in the background (default: 0)',
+            'CACHE_STALE_IF_ERROR': 'Seconds past the TTL an answer is served when the AI service fails (default: 86400)',
+            'CACHE_FOLD_STOPWORDS': 'Ignore polite openers and closing particles in cache keys (default: False)',
+            'CACHE_WARMUP_FILE': 'JSONL traffic log replayed into the cache before reporting ready (default: none)',
+            'CACHE_WARMUP_TOP': 'Number of most frequent questions replayed at warm-up (default: 100)',
+            'CACHE_WARMUP_CONCURRENCY': 'Concurrent upstream calls during cache warm-up (default: 2)',
+            'TRAFFIC_LOG_PATH': 'Append every generation request to this JSONL file (default: none)',
+            'REQUEST_COALESCING': 'Let identical in-flight questions share one upstream call (default: True)',
+            'SEMANTIC_CACHE_ENABLED': 'Answer reworded questions from similar cached ones; needs numpy (default: False)',
+            'SEMANTIC_CACHE_THRESHOLD': 'Cosine similarity needed for a semantic match (default: 0.9)',
+            'SEMANTIC_CACHE_DIM': 'Dimensions of the hashed n-gram question vectors (default: 256)',
+            'SEMANTIC_CACHE_MAX_ENTRIES': 'Maximum number of questions in the semantic cache (default: 10000)',
+            'SEMANTIC_CACHE_MAX_BYTES': 'Byte budget for answers held by the semantic cache (default: 33554432)'
         }
     }
     
@@ -0,0 +1,60 @@
+# Micro-benchmark for cache key canonicalization
+# Usage: python benchmarks/bench_canonicalize.py [iterations]
+
+import os
+import sys
+import timeit
+import unicodedata
+
+# Import the app without connecting upstream or starting background threads
+os.environ.setdefault('GRADIO_WARMUP_ON_START', 'False')
+os.environ.setdefault('GRADIO_KEEPALIVE_INTERVAL', '0')
+os.environ.setdefault('GRADIO_QUEUE_POLL_INTERVAL', '0')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import canonicalize_question  # noqa: E402
+
+SAMPLES = [
+    'Luật lao động quy định thời giờ làm việc như thế nào?',
+    'Cho em hỏi: mức phạt khi vượt đèn đỏ là bao nhiêu vậy ạ?',
+    'Luật sư ơi, cho mình hỏi về thủ tục ly hôn đơn phương nhé, cảm ơn ạ!!',
+    'Điều 5, khoản 2 - Bộ luật Dân sự 2015 quy định gì?',
+    'Người lao động có quyền đơn phương chấm dứt hợp đồng lao động trong trường hợp nào',
+    'thuế thu nhập cá nhân',
+]
+
+def baseline(text: str) -> str:
+    """Whitespace and case folding only"""
+    return ' '.join(text.split()).casefold()
+
+def check_equivalence():
+    """Variants of one question must share a canonical key"""
+    question = 'Luật lao động quy định thời giờ làm việc như thế nào?'
+    variants = [
+        question,
+        unicodedata.normalize('NFD', question),
+        '  LUẬT LAO ĐỘNG   quy định thời giờ làm việc như thế nào ',
+        'luật lao động quy định thời giờ làm việc như thế nào???',
+    ]
+    keys = {canonicalize_question(v) for v in variants}
+    assert len(keys) == 1, keys
+    assert canonicalize_question('Cho em hỏi luật lao động ạ', True) == 'luật lao động'
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    check_equivalence()
+    nfd_samples = [unicodedata.normalize('NFD', s) for s in SAMPLES]
+    cases = [
+        ('baseline (split/casefold)', lambda: [baseline(s) for s in SAMPLES]),
+        ('canonicalize', lambda: [canonicalize_question(s) for s in SAMPLES]),
+        ('canonicalize (NFD input)', lambda: [canonicalize_question(s) for s in nfd_samples]),
+        ('canonicalize + stop words', lambda: [canonicalize_question(s, True) for s in SAMPLES]),
+    ]
+    print(f"{len(SAMPLES)} questions x {iterations} iterations")
+    for name, fn in cases:
+        best = min(timeit.repeat(fn, number=iterations, repeat=3))
+        per_call = best / (iterations * len(SAMPLES)) * 1e6
+        print(f"{name:<28} {per_call:7.2f} us/question")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# Hit-ratio benchmark for the memory cache eviction policies
+# Usage: python benchmarks/bench_eviction.py [traffic.jsonl]
+#
+# Replays a JSONL traffic log (the TRAFFIC_LOG_PATH format) or, without one,
+# a synthetic trace of Zipf-distributed popular questions interleaved with
+# /batch-style scans of one-off questions.
+
+import json
+import os
+import random
+import sys
+import time
+
+# Import the app without connecting upstream or starting background threads
+os.environ.setdefault('GRADIO_WARMUP_ON_START', 'False')
+os.environ.setdefault('GRADIO_KEEPALIVE_INTERVAL', '0')
+os.environ.setdefault('GRADIO_QUEUE_POLL_INTERVAL', '0')
+os.environ.setdefault('SAMPLE_POOL_SIZE', '0')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import MemoryCacheBackend, request_key, DEFAULT_MAX_LENGTH, DEFAULT_TEMPERATURE, DEFAULT_TOP_P  # noqa: E402
+
+def load_trace(path: str) -> list:
+    trace = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            user_input = record.get('user_input') or record.get('question')
+            if isinstance(user_input, str):
+                trace.append(request_key(user_input,
+                                         record.get('max_length', DEFAULT_MAX_LENGTH),
+                                         record.get('temperature', DEFAULT_TEMPERATURE),
+                                         record.get('top_p', DEFAULT_TOP_P),
+                                         record.get('endpoint', '/generate_response')))
+    return trace
+
+def synthetic_trace(length: int = 200000, popular: int = 5000, seed: int = 7) -> list:
+    """Zipf(0.9) popular questions, with a 500-question scan of unique ones every 5000 requests"""
+    rng = random.Random(seed)
+    weights = [1.0 / (rank ** 0.9) for rank in range(1, popular + 1)]
+    picks = rng.choices(range(popular), weights=weights, k=length)
+    trace = []
+    unique = 0
+    for i, pick in enumerate(picks):
+        trace.append(f"faq-{pick}")
+        if i % 5000 == 4999:
+            for _ in range(500):
+                trace.append(f"scan-{unique}")
+                unique += 1
+    return trace
+
+def replay(trace: list, capacity: int, policy: str) -> tuple:
+    cache = MemoryCacheBackend(max_entries=capacity, policy=policy)
+    hits = 0
+    started = time.perf_counter()
+    for key in trace:
+        if cache.get(key) is not None:
+            hits += 1
+        else:
+            cache.set(key, b'answer', 3600)
+    elapsed = time.perf_counter() - started
+    return hits / len(trace), elapsed / len(trace) * 1e6
+
+def main():
+    trace = load_trace(sys.argv[1]) if len(sys.argv) > 1 else synthetic_trace()
+    if not trace:
+        sys.exit('Trace is empty')
+    distinct = len(set(trace))
+    print(f"{len(trace)} requests, {distinct} distinct")
+    print(f"{'capacity':>9} {'lru hit%':>9} {'tinylfu hit%':>13} {'lru us/op':>10} {'tinylfu us/op':>14}")
+    for fraction in (0.01, 0.05, 0.1, 0.25):
+        capacity = max(10, int(distinct * fraction))
+        lru_ratio, lru_cost = replay(trace, capacity, 'lru')
+        lfu_ratio, lfu_cost = replay(trace, capacity, 'tinylfu')
+        print(f"{capacity:>9} {lru_ratio * 100:>9.2f} {lfu_ratio * 100:>13.2f} {lru_cost:>10.2f} {lfu_cost:>14.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# Matching quality and lookup speed of the semantic cache
+# Usage: python benchmarks/bench_semantic.py [entries]
+#
+# Scores pairs of questions that should share an answer against pairs that
+# must not (different articles, years, procedures), checks the default
+# threshold separates them, then times lookups against a full matrix.
+
+import os
+import sys
+import time
+
+# Import the app without connecting upstream or starting background threads
+os.environ.setdefault('GRADIO_WARMUP_ON_START', 'False')
+os.environ.setdefault('GRADIO_KEEPALIVE_INTERVAL', '0')
+os.environ.setdefault('GRADIO_QUEUE_POLL_INTERVAL', '0')
+os.environ.setdefault('SAMPLE_POOL_SIZE', '0')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import SemanticCache, canonicalize_question, SEMANTIC_CACHE_DIM, SEMANTIC_CACHE_THRESHOLD  # noqa: E402
+
+SAME = [
+    ('luật lao động', 'bộ luật lao động Việt Nam'),
+    ('Mức phạt vượt đèn đỏ là bao nhiêu?', 'mức phạt khi vượt đèn đỏ là bao nhiêu'),
+    ('thủ tục ly hôn đơn phương', 'thủ tục ly hôn đơn phương như thế nào'),
+    ('Điều 5 Bộ luật Dân sự 2015 quy định gì?', 'Điều 5 Bộ luật dân sự năm 2015 quy định những gì'),
+    ('thuế thu nhập cá nhân năm 2023', 'mức thuế thu nhập cá nhân năm 2023'),
+    ('Người lao động được nghỉ phép bao nhiêu ngày?', 'người lao động được nghỉ phép năm bao nhiêu ngày'),
+]
+
+DIFFERENT = [
+    ('Điều 5 Bộ luật Dân sự 2015 quy định gì?', 'Điều 6 Bộ luật Dân sự 2015 quy định gì?'),
+    ('thuế thu nhập cá nhân năm 2023', 'thuế thu nhập cá nhân năm 2024'),
+    ('mức phạt vượt đèn đỏ 500000 đồng', 'mức phạt vượt đèn đỏ 5000000 đồng'),
+    ('thủ tục ly hôn đơn phương', 'thủ tục ly hôn thuận tình'),
+    ('quyền của người lao động', 'nghĩa vụ của người lao động'),
+    ('luật lao động', 'luật đất đai'),
+    ('thời hạn hợp đồng lao động', 'chấm dứt hợp đồng lao động'),
+    ('mức phạt vượt đèn đỏ đối với xe máy', 'mức phạt vượt đèn đỏ đối với ô tô'),
+    ('thủ tục đăng ký kết hôn', 'thủ tục đăng ký khai sinh'),
+]
+
+PARAMS = (512.0, 0.7, 0.9, '/generate_response')
+
+def score(cache: SemanticCache, cached: str, asked: str) -> float:
+    """Similarity a lookup of `asked` reports against a cache holding only `cached`"""
+    cache.clear()
+    cache.add(canonicalize_question(cached), PARAMS, 'answer')
+    return cache.lookup(canonicalize_question(asked), PARAMS)[1]
+
+def check_defaults():
+    """Every SAME pair must hit and every DIFFERENT pair miss at the defaults"""
+    cache = SemanticCache(threshold=SEMANTIC_CACHE_THRESHOLD, dim=SEMANTIC_CACHE_DIM)
+    for a, b in SAME:
+        assert score(cache, a, b) >= cache.threshold, (a, b, score(cache, a, b))
+    for a, b in DIFFERENT:
+        assert score(cache, a, b) < cache.threshold, (a, b, score(cache, a, b))
+
+def separation():
+    print(f"{'dim':>5} {'lowest same':>12} {'highest different':>18}")
+    for dim in (128, 256, 512):
+        cache = SemanticCache(dim=dim)
+        same = min(score(cache, a, b) for a, b in SAME)
+        different = max(score(cache, a, b) for a, b in DIFFERENT)
+        print(f"{dim:>5} {same:>12.3f} {different:>18.3f}")
+
+def lookup_speed(entries: int):
+    cache = SemanticCache(dim=SEMANTIC_CACHE_DIM, max_entries=entries, max_bytes=1 << 40)
+    for i in range(entries):
+        cache.add(f"câu hỏi pháp luật số {i} về hợp đồng lao động", PARAMS, 'answer')
+    question = 'hợp đồng lao động có thời hạn tối đa bao lâu'
+    started = time.perf_counter()
+    for _ in range(20):
+        cache.lookup(question, PARAMS)
+    single = (time.perf_counter() - started) / 20
+    batch = [f"{question} {i}" for i in range(64)]
+    started = time.perf_counter()
+    cache.lookup_many(batch, PARAMS)
+    batched = (time.perf_counter() - started) / len(batch)
+    print(f"{entries} entries at {SEMANTIC_CACHE_DIM} dims: {single * 1000:.2f} ms/lookup, "
+          f"{batched * 1000:.2f} ms/question batched")
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    check_defaults()
+    print(f"Defaults (threshold {SEMANTIC_CACHE_THRESHOLD}, dim {SEMANTIC_CACHE_DIM}) separate "
+          f"{len(SAME)} same and {len(DIFFERENT)} different pairs")
+    separation()
+    lookup_speed(entries)
+
+if __name__ == '__main__':
+    main()